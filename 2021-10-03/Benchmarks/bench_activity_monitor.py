@@ -0,0 +1,31 @@
+"""Benchmark evaluating the activity the ActivityMonitor collects every second"""
+
+import random
+from common import load_daemons_module, measure
+
+classes = load_daemons_module("shared.classes")
+
+TITLES = ["main.py - Other-projects - Visual Studio Code", "Minecraft 1.17.1", "Film.mkv - VLC media player", "MPC-HC", "Todoist - Mozilla Firefox", "Terminal", "", "Obsidian"]
+
+
+def generate_log(seconds: int, seed: int = 0) -> [str]:
+    """Return the titles of the active window for every second, in stretches of a few minutes"""
+    rng = random.Random(seed)
+    log = []
+    while len(log) < seconds:
+        log += [rng.choice(TITLES)] * rng.randint(10, 600)
+    return log[:seconds]
+
+
+def main():
+    monitor = classes.ActivityMonitor()
+    # the monitor keeps the last 20 minutes, the categories of one title per second
+    monitor.activity_log = [monitor.classify(title) for title in generate_log(20 * 60)]
+    # every daemon asks about its own activities, every second
+    queries = [("movie", 50, 20), ("gaming", 30, 10), ("coding,movie", 50, 20), ("all", 80, 5)]
+    measure("classify x1000", lambda: [monitor.classify(title) for _ in range(125) for title in TITLES], items=1000)
+    measure("evaluate_activity x1000", lambda: [monitor.evaluate_activity(*query) for _ in range(250) for query in queries], items=1000)
+
+
+if __name__ == "__main__":
+    main()
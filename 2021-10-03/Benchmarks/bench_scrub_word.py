@@ -0,0 +1,33 @@
+"""Benchmark scrubbing a large backlog of dict.cc terms"""
+
+import random
+from common import load_module, measure
+
+scrubbing = load_module("Import Dict.cc and Cambridge to Anki", "scrubbing")
+
+WORDS = ["give", "run", "take", "look", "break", "carry", "turn", "set", "bring", "put", "hold", "come", "stand", "fall", "pass", "bear", "catch", "draw"]
+PARTICLES = ["up", "off", "on", "upon", "into", "about", "back", "(off)", "to", "out"]
+ANNOTATIONS = ["[coll.]", "{verb}", "[fig.]", "<sth.>", "{noun}", "[Br.]"]
+
+
+def generate_terms(count: int, seed: int = 0) -> [str]:
+    """Return count dict.cc export lines (english, tab, german) in the shapes the crawler produces"""
+    rng = random.Random(seed)
+    terms = []
+    for i in range(count):
+        parts = [rng.choice(["to", "a", "be", "make", ""]), rng.choice(WORDS) + str(i % 997), rng.choice(["sth.", "sb.", ""]), rng.choice(PARTICLES), rng.choice(ANNOTATIONS + [""] * 3)]
+        terms.append(" ".join(x for x in parts if x) + "\tetw. machen {verb}")
+    return terms
+
+
+def main():
+    terms = generate_terms(10000)
+    unique = len(set(terms))
+
+    measure("scrub_words 10k terms (cold)", scrubbing.scrub_words, terms, items=len(terms), setup=scrubbing.scrub_word.cache_clear)
+    measure("scrub_words 10k terms (memoized)", scrubbing.scrub_words, terms, items=len(terms))
+    print(f"{unique} unique terms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""Benchmark ranking the streams of a video and selecting video and audio"""
+
+from common import load_module, measure
+from fake_streams import fake_catalog
+
+streams = load_module("Import YouTube to Obsidian", "streams")
+
+def main():
+    cases = [("4k, 5 min", fake_catalog(), 300, None), ("4k, 2 h", fake_catalog(), 7200, None), ("720p mp4 only, 30 min", fake_catalog(720, ["mp4"]), 1800, None),
+             ("4k, 2 h, 1 Mbit/s budget", fake_catalog(), 7200, 1000000)]
+    for name, catalog, length, max_bitrate in cases:
+        video, audio, extension = streams.select_streams(catalog, length, max_bitrate=max_bitrate)
+        print(f"{name:<30} -> {video.resolution} {video.codec} + {audio.itag} ({extension})")
+        measure(f"select_streams x1000 ({name})", lambda: [streams.select_streams(catalog, length, max_bitrate=max_bitrate) for _ in range(1000)], items=1000)
+
+
+if __name__ == "__main__":
+    main()
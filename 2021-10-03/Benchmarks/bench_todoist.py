@@ -0,0 +1,46 @@
+"""Benchmark indexing synthetic Todoist states and the queries the daemons run on them"""
+
+import random
+from datetime import datetime, timedelta
+from common import load_daemons_module, measure
+
+todoist_wrapper = load_daemons_module("shared.todoist_wrapper")
+
+
+def generate_state(item_count: int, seed: int = 0) -> dict:
+    """Return a Todoist state like the sync API's: about 20 items per project, some projects nested, archived or with sections,
+    a tenth of the items completed or deleted and ages up to two years"""
+    rng = random.Random(seed)
+    now = datetime.now()
+    project_count = max(1, item_count // 20)
+    projects = [{"id": 1000 + i, "name": f"Project {i}", "parent_id": rng.choice([None] * 4 + [1000]) if i else None, "is_archived": int(rng.random() < 0.05), "is_deleted": 0}
+                for i in range(project_count)]
+    sections = [{"id": 5000 + i, "name": f"Section {i}", "project_id": rng.choice(projects)["id"], "is_deleted": False, "is_archived": False} for i in range(project_count // 4)]
+    items = [{"id": 100000 + i, "content": f"item {i}", "project_id": rng.choice(projects)["id"], "section_id": None,
+              "date_added": (now - timedelta(days=rng.expovariate(1 / 120) % 730)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+              "is_deleted": int(rng.random() < 0.03), "checked": int(rng.random() < 0.07)} for i in range(item_count)]
+    return {"projects": projects, "sections": sections, "items": items, "labels": []}
+
+
+def synthetic_todoist(state: dict):
+    """Todoist wrapper around the state, without the API behind it"""
+    todoist = todoist_wrapper.Todoist.__new__(todoist_wrapper.Todoist)
+    todoist.api, todoist.state = None, state
+    todoist.cache()
+    return todoist
+
+
+def main():
+    for item_count in [1000, 10000, 100000]:
+        state = generate_state(item_count)
+        todoist = synthetic_todoist(state)
+        project_ids = [project["id"] for project in todoist.active_projects()][:50]
+        label = f"{item_count // 1000}k items"
+        measure(f"Todoist.cache ({label})", todoist.cache, items=item_count, repeat=3)
+        measure(f"items_by_project x{len(project_ids)} ({label})", lambda: [todoist.items_by_project(project_id) for project_id in project_ids], items=len(project_ids), repeat=3)
+        # every project is checked once, each check scanning all items
+        measure(f"UnusedProjects selection ({label})", todoist.small_inactive_projects, items=len(todoist.active_projects()), repeat=1 if item_count > 10000 else 3)
+
+
+if __name__ == "__main__":
+    main()
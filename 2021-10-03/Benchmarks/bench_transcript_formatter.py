@@ -0,0 +1,34 @@
+"""Benchmark formatting multi-hour transcripts into 30 second markdown blocks"""
+
+import io
+import random
+from common import load_module, measure
+
+captions = load_module("Import YouTube to Obsidian", "captions")
+
+WORDS = ["so", "the", "model", "we", "lecture", "gradient", "and", "this", "is", "where", "it", "gets", "interesting", "you", "can", "see", "that"]
+
+
+def generate_transcript(hours: float, seed: int = 0) -> [dict]:
+    """Return transcript segments like YouTube's: a few seconds each, in chronological order, with occasional silent gaps"""
+    rng = random.Random(seed)
+    segments = []
+    start = 0.0
+    while start < hours * 3600:
+        duration = rng.uniform(1.5, 6)
+        segments.append({"text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))), "start": round(start, 3), "duration": round(duration, 3)})
+        # sometimes nobody talks for more than a block
+        start += duration + (rng.uniform(30, 90) if rng.random() < 0.01 else 0)
+    return segments
+
+
+def main():
+    formatter = captions.Obsidian30SecondSnippetsFormatter()
+    for hours in [1, 4, 10]:
+        transcript = generate_transcript(hours)
+        measure(f"format_transcript {hours} h", formatter.format_transcript, transcript, items=len(transcript))
+        measure(f"write_transcript {hours} h", lambda: formatter.write_transcript(transcript, io.StringIO()), items=len(transcript))
+
+
+if __name__ == "__main__":
+    main()
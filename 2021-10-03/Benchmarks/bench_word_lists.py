@@ -0,0 +1,43 @@
+"""Benchmark the word list bookkeeping: diffing dict.cc exports and reading the folders of imported words"""
+
+import os
+import random
+import tempfile
+from common import load_module, load_daemons_module, measure
+
+miscellaneous = load_daemons_module("daemons.miscellaneous")
+daemon_utils = load_daemons_module("shared.utils")
+word_files = load_module("Import Dict.cc and Cambridge to Anki", "word_files")
+
+
+def generate_export(count: int, seed: int = 0) -> [str]:
+    """Return dict.cc export lines (english, tab, german)"""
+    rng = random.Random(seed)
+    return [f"{rng.choice(['to ', 'a ', ''])}word{i} {rng.choice(['[coll.]', '{verb}', ''])}\tWort{i}" for i in range(count)]
+
+
+def generate_done_folder(folder: str, word_count: int, words_per_file: int = 40, seed: int = 0):
+    """Write the words into text files like the importers do, one file per import run, with some words imported twice"""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(word_count)] + [f"word{rng.randrange(word_count)}" for _ in range(word_count // 10)]
+    for start in range(0, len(words), words_per_file):
+        with open(os.path.join(folder, f"{start:08} imported.txt"), "w", encoding="utf-8") as file:
+            file.write("# imported\n" + "\n".join(words[start:start + words_per_file]))
+
+
+def main():
+    for count in [1000, 5000, 20000]:
+        # the crawler compares the export with the last one, which lacks the newest entries
+        current = generate_export(count)
+        known = current[:-50]
+        measure(f"DictccCrawler diff ({count // 1000}k entries)", miscellaneous.new_entries, current, known, items=count, repeat=1 if count > 5000 else 3)
+
+    for count in [1000, 10000, 100000]:
+        with tempfile.TemporaryDirectory() as folder:
+            generate_done_folder(folder, count)
+            measure(f"all_imported_words ({count // 1000}k words)", word_files.read_word_files, folder, items=count)
+            measure(f"KindleImport.load_imported ({count // 1000}k words)", daemon_utils.read_word_files, folder, items=count)
+
+
+if __name__ == "__main__":
+    main()
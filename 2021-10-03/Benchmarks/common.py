@@ -0,0 +1,74 @@
+"""Helpers shared by the benchmarks"""
+
+import importlib
+import os
+import sys
+import types
+import time
+import tracemalloc
+
+# folder containing all projects
+root = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+results = []  # every result reported in this run, compared against the baselines by run_all.py
+
+
+def register_project(project: str) -> str:
+    """Register a project folder as a package under a valid name without running its __init__, and return that name.
+    The project folders aren't valid package names and their __init__ files need Anki. Relative imports inside the project still work"""
+    package = "".join(c if c.isalnum() else "_" for c in project).lower()
+    if package not in sys.modules:
+        module = types.ModuleType(package)
+        module.__path__ = [os.path.join(root, project)]
+        sys.modules[package] = module
+    return package
+
+
+def load_module(project: str, name: str):
+    """Import a single module of a project by its path"""
+    return importlib.import_module(f"{register_project(project)}.{name}")
+
+
+def load_daemons_module(name: str):
+    """Import a module of the daemons, which import each other from the Daemons folder (from shared.utils import ...)"""
+    folder = os.path.join(root, "Daemons")
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+    return importlib.import_module(name)
+
+
+def timed(function, *args, repeat: int = 5, setup=None) -> float:
+    """Return the best wall clock time in seconds of calling function(*args) %repeat times. setup() is called untimed before every call"""
+    best = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function(*args)
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def peak_memory(function, *args, setup=None) -> int:
+    """Return the most memory in bytes that was allocated at once while calling function(*args). setup() is called before, untraced"""
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def report(name: str, seconds: float, items: int, memory: int = None):
+    """Print one result line with total time, throughput and (if measured) peak memory, and keep it for the comparison with the baselines"""
+    results.append({"name": name, "seconds": seconds, "items_per_second": items / seconds if seconds else None, "peak_bytes": memory})
+    print("{:<55} {:>10.2f} ms {:>14,.0f} items/s {:>12}".format(name, seconds * 1000, items / seconds if seconds else float("inf"),
+                                                                  f"{memory / 1024 ** 2:,.1f} MiB" if memory is not None else ""))
+
+
+def measure(name: str, function, *args, items: int, repeat: int = 5, setup=None):
+    """Time function(*args), then measure its peak memory in a separate call (tracing slows it down) and report both"""
+    report(name, timed(function, *args, repeat=repeat, setup=setup), items, peak_memory(function, *args, setup=setup))
@@ -0,0 +1,47 @@
+"""Stand-in for pytube streams, for benchmarking and testing stream selection without YouTube"""
+
+from dataclasses import dataclass
+
+# itag, type, container, resolution, codec, bitrate (bits per second). Modeled on the formats YouTube offers for a 4k video
+CATALOG = [
+    (313, "video", "webm", "2160p", "vp9", 17000000), (401, "video", "mp4", "2160p", "av01.0.12M.08", 12000000),
+    (271, "video", "webm", "1440p", "vp9", 9000000), (400, "video", "mp4", "1440p", "av01.0.12M.08", 6000000),
+    (137, "video", "mp4", "1080p", "avc1.640028", 4400000), (248, "video", "webm", "1080p", "vp9", 2600000), (399, "video", "mp4", "1080p", "av01.0.08M.08", 2100000),
+    (136, "video", "mp4", "720p", "avc1.4d401f", 2300000), (247, "video", "webm", "720p", "vp9", 1500000), (398, "video", "mp4", "720p", "av01.0.05M.08", 1100000),
+    (135, "video", "mp4", "480p", "avc1.4d401e", 1100000), (244, "video", "webm", "480p", "vp9", 750000),
+    (134, "video", "mp4", "360p", "avc1.4d401e", 650000), (243, "video", "webm", "360p", "vp9", 420000),
+    (133, "video", "mp4", "240p", "avc1.4d4015", 290000), (242, "video", "webm", "240p", "vp9", 230000),
+    (160, "video", "mp4", "144p", "avc1.4d400c", 110000), (278, "video", "webm", "144p", "vp9", 95000),
+    (140, "audio", "mp4", None, None, 130000), (249, "audio", "webm", None, None, 55000), (250, "audio", "webm", None, None, 72000), (251, "audio", "webm", None, None, 140000),
+]
+
+
+@dataclass
+class FakeStream:
+    itag: int
+    type: str
+    subtype: str
+    resolution: str
+    codec: str
+    bitrate: int
+    is_progressive: bool = False
+
+    @property
+    def mime_type(self):
+        return f"{self.type}/{self.subtype}"
+
+    @property
+    def video_codec(self):
+        return self.codec if self.type == "video" else None
+
+    @property
+    def audio_codec(self):
+        return "opus" if self.subtype == "webm" else "mp4a.40.2" if self.type == "audio" else None
+
+
+def fake_catalog(max_resolution: int = 2160, containers: [str] = ("webm", "mp4")) -> [FakeStream]:
+    """Return the streams of a fake video that is available up to max_resolution, in the given containers, plus a progressive 360p stream"""
+    streams = [FakeStream(*entry) for entry in CATALOG if entry[2] in containers and (entry[3] is None or int(entry[3][:-1]) <= max_resolution)]
+    if "mp4" in containers:
+        streams.append(FakeStream(18, "video", "mp4", "360p", "avc1.42001E", 500000, is_progressive=True))
+    return streams
@@ -0,0 +1,356 @@
+"""Record responses of the external services (Todoist, Hue bridge, dict.cc, Cambridge, phrasefinder, checkip/ipinfo, YouTube) to fixtures and replay them offline,
+with configurable latency and injected errors, so the daemons and importers can be measured reproducibly without network.
+
+Requests made through requests (and everything built on it) and urllib (pytube) are intercepted in the process.
+Other processes can use the replay server as HTTP proxy, which works for plain http only.
+
+    python replay.py run --record -f fixtures/todoist ../Daemons/run_todoist_daemon.py
+    python replay.py run -f fixtures/todoist --latency 0.2 --errors 0.05 --seconds 60 ../Daemons/run_todoist_daemon.py
+    python replay.py run -f fixtures/youtube -m "Import YouTube to Obsidian:batch" https://www.youtube.com/watch?v=...
+    python replay.py serve -f fixtures/hue --port 8080
+"""
+
+import argparse
+import base64
+import hashlib
+import http.client
+import io
+import json
+import os
+import random
+import runpy
+import socket
+import sys
+import threading
+import time
+import _thread
+import urllib.error
+import urllib.request
+import urllib.response
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from common import register_project
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from requests.structures import CaseInsensitiveDict
+except ImportError:
+    requests = None
+
+# query parameters that are left out of the fixture key: secrets and values that change on every run
+IGNORED_PARAMS = {"key", "token", "api_key", "access_token"}
+# request headers that are part of the fixture key
+KEY_HEADERS = ["Range"]
+# response headers that don't apply to the stored body
+DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection"}
+RECORD_MAX_BYTES = 50 * 1024 ** 2  # larger responses aren't recorded
+PROBE_ADDRESSES = {("8.8.8.8", 53)}  # connected to by has_internet_connection() of the daemons and the Anki add-on
+
+
+class MissingFixture(requests.exceptions.ConnectionError if requests else ConnectionError):
+    """No response was recorded for the request. A connection error, so callers handle it like any failed request"""
+    pass
+
+
+class InjectedError(ConnectionError):
+    pass
+
+
+def normalize_url(url: str) -> str:
+    """Url with sorted query parameters, without the ignored ones"""
+    parts = urlsplit(url)
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in IGNORED_PARAMS))
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path or "/", query, ""))
+
+
+class FixtureStore:
+    """Folder of recorded responses, one json lines file per request (method, url and key headers), one line per response.
+    The request body is not part of the key: repeated requests get the responses in the order they were recorded, the last one is repeated after that.
+    Every fixture is read from disk once, recording appends to its file"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.lock = threading.Lock()
+        self.replayed = Counter()
+        self.fixtures: {str: [(int, dict, bytes)]} = {}  # decoded responses of the keys that have been used
+        os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def key(method: str, url: str, headers: dict) -> str:
+        headers = {k.lower(): v for k, v in headers.items()}
+        return " ".join([method.upper(), normalize_url(url)] + [f"{h}={headers[h.lower()]}" for h in KEY_HEADERS if h.lower() in headers])
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.folder, hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + ".jsonl")
+
+    def load(self, key: str) -> [(int, dict, bytes)]:
+        """Responses recorded for the key, read from disk on first use. Expects the lock to be held"""
+        if key not in self.fixtures:
+            responses = []
+            if os.path.isfile(path := self.path(key)):
+                with open(path, "r", encoding="utf-8") as file:
+                    responses = [json.loads(line) for line in file if line.strip()]
+            self.fixtures[key] = [(response["status"], response["headers"], base64.b64decode(response["body"])) for response in responses]
+        return self.fixtures[key]
+
+    def add(self, key: str, status: int, headers: dict, body: bytes):
+        """Append a response to the fixture of the request"""
+        headers = {k: v for k, v in headers.items() if k.lower() not in DROPPED_HEADERS}
+        line = json.dumps({"key": key, "status": status, "headers": headers, "body": base64.b64encode(body).decode("ascii")})
+        with self.lock:
+            self.load(key).append((status, headers, body))
+            with open(self.path(key), "a", encoding="utf-8") as file:
+                file.write(line + "\n")
+
+    def next(self, key: str) -> (int, dict, bytes):
+        """Return status, headers and body of the next recorded response to the request"""
+        with self.lock:
+            if not (responses := self.load(key)):
+                raise MissingFixture(f"No fixture for {key}")
+            response = responses[min(self.replayed[key], len(responses) - 1)]
+            self.replayed[key] += 1
+        return response
+
+
+class ReplayTransport:
+    """Answers requests from the fixture store, or records the real responses into it.
+    :param latency: seconds every replayed response is delayed, plus up to %jitter seconds at random
+    :param error_rate: share of replayed requests that fail with a connection error
+    :param server_error_rate: share of replayed requests that get a 503 response"""
+
+    def __init__(self, store: FixtureStore, record: bool = False, latency: float = 0, jitter: float = 0, error_rate: float = 0, server_error_rate: float = 0, seed: int = 0):
+        self.store = store
+        self.record = record
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.server_error_rate = server_error_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.calls = Counter()
+        self.original_send = None
+
+    def respond(self, method: str, url: str, headers: dict) -> (int, dict, bytes):
+        """Replayed response to a request, after the configured latency. Raises InjectedError for injected connection errors"""
+        self.calls[urlsplit(url).netloc] += 1
+        with self.random_lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failure = self.random.random()
+        time.sleep(delay)
+        if failure < self.error_rate:
+            raise InjectedError(f"Injected connection error for {method} {url}")
+        if failure < self.error_rate + self.server_error_rate:
+            return 503, {"Content-Type": "text/plain"}, b"Injected server error"
+        return self.store.next(self.store.key(method, url, headers))
+
+    def save(self, method: str, url: str, headers: dict, status: int, response_headers: dict, body: bytes):
+        self.calls[urlsplit(url).netloc] += 1
+        if len(body) > RECORD_MAX_BYTES:
+            print(f"Not recording {url}, response is too large ({len(body)} bytes)")
+            return
+        self.store.add(self.store.key(method, url, headers), status, response_headers, body)
+
+    # requests
+
+    def send(self, adapter, request, **kwargs):
+        """Replacement for HTTPAdapter.send"""
+        if self.record:
+            response = self.original_send(adapter, request, **kwargs)
+            self.save(request.method, request.url, request.headers, response.status_code, response.headers, response.content)
+            return response
+
+        try:
+            status, headers, body = self.respond(request.method, request.url, request.headers)
+        except InjectedError as e:
+            raise requests.exceptions.ConnectionError(str(e), request=request)
+        response = requests.models.Response()
+        response.status_code = status
+        response.reason = http.client.responses.get(status, "")
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(body)
+        response._content = body
+        response._content_consumed = True  # iter_content serves the body from _content
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        return response
+
+    # urllib
+
+    def urllib_handler(self):
+        transport = self
+
+        class ReplayHandler(urllib.request.BaseHandler):
+            handler_order = 100  # before the real http handlers
+
+            def http_open(self, request):
+                if transport.record:
+                    # let the real handler do the request
+                    return None
+                try:
+                    status, headers, body = transport.respond(request.get_method(), request.full_url, dict(request.header_items()))
+                except (InjectedError, MissingFixture) as e:
+                    raise urllib.error.URLError(e)
+                return make_urllib_response(request.full_url, status, headers, body)
+
+            def http_response(self, request, response):
+                if not transport.record:
+                    return response
+                body = response.read()
+                headers = dict(response.headers.items())
+                transport.save(request.get_method(), request.full_url, dict(request.header_items()), response.status, headers, body)
+                return make_urllib_response(request.full_url, response.status, headers, body)
+
+            https_open = http_open
+            https_response = http_response
+
+        return ReplayHandler()
+
+    # installing
+
+    def install(self):
+        """Route all requests of this process through the transport. While replaying, the connectivity probes succeed without network too"""
+        if requests is not None:
+            self.original_send = HTTPAdapter.send
+            HTTPAdapter.send = lambda adapter, request, **kwargs: self.send(adapter, request, **kwargs)
+        urllib.request.install_opener(urllib.request.build_opener(self.urllib_handler()))
+        if not self.record:
+            socket.socket = ProbeSocket
+
+    def uninstall(self):
+        if self.original_send:
+            HTTPAdapter.send = self.original_send
+            self.original_send = None
+        urllib.request.install_opener(None)
+        socket.socket = ProbeSocket.__base__
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *args):
+        self.uninstall()
+
+    def summary(self) -> str:
+        return ", ".join(f"{host}: {count}" for host, count in self.calls.most_common()) or "no requests"
+
+
+class ProbeSocket(socket.socket):
+    """socket.socket while replaying: connecting to one of the PROBE_ADDRESSES succeeds right away, otherwise DaemonTask.run() skips every daemon that needs internet
+    and wait_for_internet_connection() waits forever"""
+
+    def connect(self, address):
+        if tuple(address[:2]) in PROBE_ADDRESSES:
+            return
+        return super().connect(address)
+
+
+def make_urllib_response(url: str, status: int, headers: dict, body: bytes):
+    message = http.client.HTTPMessage()
+    for k, v in headers.items():
+        message[k] = v
+    message["Content-Length"] = str(len(body))
+    response = urllib.response.addinfourl(io.BytesIO(body), message, url, status)
+    response.msg = http.client.responses.get(status, "")
+    return response
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """HTTP server answering from the fixtures, for programs that can't be patched. Use it as HTTP proxy (absolute urls)
+    or point a service's base url at it: then the Host header decides which fixtures are used"""
+
+    def __init__(self, transport: ReplayTransport, port: int = 8080):
+        self.transport = transport
+        super().__init__(("127.0.0.1", port), ReplayRequestHandler)
+
+
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+
+    def handle_request(self):
+        url = self.path if self.path.startswith("http") else f"http://{self.headers.get('Host', 'localhost')}{self.path}"
+        if length := int(self.headers.get("Content-Length", 0)):
+            self.rfile.read(length)
+        try:
+            status, headers, body = self.server.transport.respond(self.command, url, dict(self.headers.items()))
+        except InjectedError:
+            # drop the connection without an answer
+            self.close_connection = True
+            return
+        except MissingFixture as e:
+            status, headers, body = 404, {"Content-Type": "text/plain"}, str(e).encode("utf-8")
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = do_HEAD = handle_request
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(transport: ReplayTransport, script: str = None, module: str = None, args: [str] = (), seconds: float = None):
+    """Run a script (path) or a project module ("project folder:module") as __main__ with the transport installed.
+    Daemons run forever, so they are interrupted after %seconds"""
+    if seconds:
+        timer = threading.Timer(seconds, _thread.interrupt_main)
+        timer.daemon = True
+        timer.start()
+    start = time.perf_counter()
+    with transport:
+        try:
+            if script:
+                sys.argv = [script, *args]
+                sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+                runpy.run_path(script, run_name="__main__")
+            else:
+                project, name = module.split(":")
+                sys.argv = [module, *args]
+                runpy.run_module(f"{register_project(project)}.{name}", run_name="__main__", alter_sys=True)
+        except KeyboardInterrupt:
+            pass
+    print(f"Finished after {time.perf_counter() - start:.1f}s. Requests: {transport.summary()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay the responses of external services")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name in ["run", "serve"]:
+        subparser = subparsers.add_parser(name)
+        subparser.add_argument("-f", "--fixtures", required=True, help="folder of the recorded responses")
+        subparser.add_argument("--latency", type=float, default=0, help="seconds every response is delayed")
+        subparser.add_argument("--jitter", type=float, default=0, help="up to this many seconds are added to the latency at random")
+        subparser.add_argument("--errors", type=float, default=0, help="share of requests that fail with a connection error")
+        subparser.add_argument("--server-errors", type=float, default=0, help="share of requests that get a 503 response")
+        subparser.add_argument("--seed", type=int, default=0)
+    subparsers.choices["run"].add_argument("--record", action="store_true", help="do the real requests and record their responses")
+    subparsers.choices["run"].add_argument("--seconds", type=float, help="stop after this many seconds")
+    subparsers.choices["run"].add_argument("-m", "--module", help='module of a project to run instead of a script, as "project folder:module"')
+    subparsers.choices["run"].add_argument("script", nargs="?")
+    subparsers.choices["run"].add_argument("args", nargs=argparse.REMAINDER)
+    subparsers.choices["serve"].add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    transport = ReplayTransport(FixtureStore(args.fixtures), record=getattr(args, "record", False), latency=args.latency, jitter=args.jitter,
+                                error_rate=args.errors, server_error_rate=args.server_errors, seed=args.seed)
+    if args.command == "serve":
+        print(f"Replaying {args.fixtures} on http://127.0.0.1:{args.port}")
+        ReplayServer(transport, args.port).serve_forever()
+        return
+
+    if args.module:
+        # the first positional argument belongs to the module
+        args.args = ([args.script] if args.script else []) + args.args
+        args.script = None
+    elif not args.script:
+        parser.error("give a script or a module")
+    run(transport, args.script, args.module, args.args, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
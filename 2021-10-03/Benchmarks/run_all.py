@@ -0,0 +1,80 @@
+"""Run all benchmarks and compare them with the stored baselines, to notice when a change makes a hot path slower or hungrier.
+Baselines depend on the machine, so they aren't shared: save your own with --save before making changes
+
+    python run_all.py --save            # run everything and store the results as baselines
+    python run_all.py todoist scrub     # run the benchmarks whose file name contains one of the words and compare them
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import traceback
+import common
+
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), "baselines.json")
+BENCHMARKS = ["bench_scrub_word", "bench_transcript_formatter", "bench_stream_selection", "bench_todoist", "bench_activity_monitor", "bench_word_lists"]
+TOLERANCE = 0.2  # slower or more memory by this share counts as regression
+
+
+def load_baselines() -> dict:
+    if not os.path.isfile(BASELINES_FILE):
+        return {}
+    with open(BASELINES_FILE, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def compare(results: [dict], baselines: dict, tolerance: float = TOLERANCE) -> [str]:
+    """Print every result next to its baseline and return the names of the regressed ones"""
+    regressions = []
+    print("\n{:<55} {:>10} {:>10} {:>8} {:>10}".format("", "ms", "baseline", "time", "memory"))
+    for result in results:
+        if not (baseline := baselines.get(result["name"])):
+            print("{:<55} {:>10.2f} {:>10}".format(result["name"], result["seconds"] * 1000, "-"))
+            continue
+        time_change = result["seconds"] / baseline["seconds"] - 1
+        memory_change = result["peak_bytes"] / baseline["peak_bytes"] - 1 if result["peak_bytes"] and baseline.get("peak_bytes") else 0
+        regressed = time_change > tolerance or memory_change > tolerance
+        print("{:<55} {:>10.2f} {:>10.2f} {:>+8.0%} {:>+10.0%}{}".format(result["name"], result["seconds"] * 1000, baseline["seconds"] * 1000, time_change, memory_change,
+                                                                         "  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(result["name"])
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmarks and compare them with the baselines")
+    parser.add_argument("filters", nargs="*", help="only run benchmarks whose name contains one of these")
+    parser.add_argument("--save", action="store_true", help="store the results as new baselines")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    failed = []
+    for name in BENCHMARKS:
+        if args.filters and not any(f in name for f in args.filters):
+            continue
+        print(f"\n{name}")
+        try:
+            importlib.import_module(name).main()
+        except Exception:
+            # e.g. a dependency of the daemons isn't installed
+            print(traceback.format_exc())
+            failed.append(name)
+
+    baselines = load_baselines()
+    regressions = compare(common.results, baselines, args.tolerance)
+    if args.save:
+        baselines.update({result["name"]: {k: v for k, v in result.items() if k != "name"} for result in common.results})
+        with open(BASELINES_FILE, "w", encoding="utf-8") as file:
+            json.dump(baselines, file, indent=1)
+        print(f"Saved {len(common.results)} baselines")
+    if failed:
+        print("Failed:", *failed)
+    if regressions:
+        print(f"{len(regressions)} regressions (more than {args.tolerance:.0%} slower or more memory)")
+    sys.exit(1 if regressions or failed else 0)
+
+
+if __name__ == "__main__":
+    main()
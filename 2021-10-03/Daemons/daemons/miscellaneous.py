@@ -3,6 +3,7 @@ import os
 import requests
 
 from shared.classes import DaemonTask
+from shared.registry import Resource
 from shared.utils import string_to_filename, os_name, has_internet_connection, public_ip, public_ip_info
 
 
@@ -39,16 +40,30 @@ class MonitorVPN(DaemonTask):
         self.ip = ip
 
 
+def new_entries(current: [str], known: [str]) -> [str]:
+    """Return the entries of the current list that aren't in the known ones, in their order"""
+    return [x for x in current if x not in known]
+
+
+def read_last_state(path: str) -> [str]:
+    """Return the entries stored in a crawler state file"""
+    with open(path, "r", encoding="utf-8") as file:
+        return [x.strip() for x in file.read().split("\n") if len(x.strip()) > 0]
+
+
 class DictccCrawler(DaemonTask):
     """crawl the dict.cc list and store any new entries as text files"""
+    FOLDER = r"/hdd/Software Engineering/.files/2021-09-23 Dict.cc und Cambridge Importer" if os_name == "Linux" else r"E:\.files\2021-09-23 Dict.cc und Cambridge Importer"
 
-    def __init__(self, list_name: str, **kwargs):
+    def __init__(self, list_name: str, last_list: [str] = None, **kwargs):
+        """
+        :param last_list: the entries crawled so far, loaded from the state file if not given. See state()
+        """
         super(DictccCrawler, self).__init__(**kwargs)
         self.callsign = "Dict.cc"
         self.interval = 5
 
         self.usercookie = "xxxxxxxxxxxxxxxxx"
-        self.FOLDER = r"/hdd/Software Engineering/.files/2021-09-23 Dict.cc und Cambridge Importer" if os_name == "Linux" else r"E:\.files\2021-09-23 Dict.cc und Cambridge Importer"
 
         # load list file url dependent on list name
         self.url = {"Wörter": 'https://deen.my.dict.cc/export/xxxx/EN-DE-xxxxx.txt',
@@ -56,9 +71,17 @@ class DictccCrawler(DaemonTask):
 
         # setup and load paths and files
         self.destination_dir = os.path.join(self.FOLDER, "dict cc crawled vocabulary", list_name)
-        self.last_state_file_path = os.path.join(self.FOLDER, f"crawler laststate {list_name}.txt")
-        self.last_list = [x.strip() for x in open(self.last_state_file_path, "r", encoding="utf-8").read().split("\n")
-                          if len(x.strip()) > 0]
+        self.last_state_file_path = self.last_state_file(list_name)
+        self.last_list = last_list if last_list is not None else read_last_state(self.last_state_file_path)
+
+    @classmethod
+    def last_state_file(cls, list_name: str) -> str:
+        return os.path.join(cls.FOLDER, f"crawler laststate {list_name}.txt")
+
+    @classmethod
+    def state(cls, list_name: str) -> Resource:
+        """The crawled entries of the list, loaded in the background by the DaemonRegistry: declare(DictccCrawler, list_name, last_list=DictccCrawler.state(list_name))"""
+        return Resource(f"Dict.cc state {list_name}", read_last_state, cls.last_state_file(list_name))
 
     def task(self):
 
@@ -72,7 +95,7 @@ class DictccCrawler(DaemonTask):
 
         # extract all the new terms that haven't been crawled in the last run
         current = [x.strip() for x in list.text.split("\n")]
-        new = [x for x in current if x not in self.last_list]
+        new = new_entries(current, self.last_list)
 
         if new:
             self.log(f"New words: ")
@@ -88,3 +111,4 @@ class DictccCrawler(DaemonTask):
             self.last_list = self.last_list + new
             with open(self.last_state_file_path, "w+", encoding="utf-8") as file:
                 file.write("\n".join(self.last_list))
+
@@ -4,6 +4,7 @@ import time
 import os
 import sys
 from shared.classes import DaemonTask
+from shared.registry import Resource
 from termcolor import colored
 import pickle
 from urllib.parse import quote
@@ -11,16 +12,22 @@ import time
 from dataclasses import dataclass
 from requests.exceptions import ConnectionError
 from shared.classes import ActivityMonitor
-from shared.utils import os_name, project_dir
+from shared.utils import os_name, project_dir, read_word_files
 import sqlite3
 from typing import Callable
 import webbrowser
 
-todoist = Todoist()
+# loaded in the background by the DaemonRegistry, daemons that require it are created once it's ready
+todoist_resource = Resource("Todoist", Todoist)
+todoist = todoist_resource.proxy()
+KINDLE_DONE_FOLDER = os.path.join(project_dir, ".files", "kindle imported vocab")
+# the words imported from the kindle so far, read in the background as well
+kindle_imported_words = Resource("Kindle imported words", read_word_files, KINDLE_DONE_FOLDER)
 
 
 class ListDaemon(DaemonTask):
     """Open new and old entries of a list in the browser, with specified search engines"""
+    requires = [todoist_resource]
 
     @dataclass
     class List:
@@ -132,6 +139,7 @@ class ListDaemon(DaemonTask):
 
 class BookQuoteDaemon(DaemonTask):
     """Sort all items from projects containing book notes to sections in Sammelprojekten"""
+    requires = [todoist_resource]
 
     # Todo: move book quote sections if Sammelprojekt gets too full because new entries have been added to it's sections
     def __init__(self, parent_project=2264075774, project_color=45, **kwargs):
@@ -196,6 +204,7 @@ class BookQuoteDaemon(DaemonTask):
 
 class UnusedProjects(DaemonTask):
     """Move all items from projects with few items and no recent activity to sections in Sammelprojekten"""
+    requires = [todoist_resource]
 
     def __init__(self, parent_project_name="Archivierte kleine Projekte", project_color=45, **kwargs):
         super(UnusedProjects, self).__init__(**kwargs)
@@ -211,11 +220,7 @@ class UnusedProjects(DaemonTask):
 
     def task(self):
         # find all projects that have no parent project and not that many items but at least one and that have no tasks younger than 30 days
-        for project in (to_sort := [x for x in todoist.active_projects() if
-                                    not x["parent_id"] and (
-                                            (items := todoist.project_item_count(x["id"])) < 30 and items) and not any(
-                                        [x < 30 for x in [item.age.days for item in todoist.items_by_project(
-                                            x["id"])]]) and not todoist.sections_of_project(x["id"])]):
+        for project in (to_sort := todoist.small_inactive_projects(max_items=30, min_age_days=30)):
             self.log(f"Projekte zu verarbeiten: {len(to_sort)}")
             self.log(f"Working on {project['name']} ({project['id']})")
             # Determine which Sammelproject to create new section in
@@ -260,6 +265,8 @@ class UnusedProjects(DaemonTask):
 
 
 class SyncTodoistAPI(DaemonTask):
+    requires = [todoist_resource]
+
     def __init__(self, **kwargs):
         super(SyncTodoistAPI, self).__init__(**kwargs)
 
@@ -277,6 +284,7 @@ class SyncTodoistAPI(DaemonTask):
 
 class PickleBackupTodoistAPI(DaemonTask):
     """Once a day, save the API object to a file"""
+    requires = [todoist_resource]
 
     def __init__(self, filename: str = "Todoist API Backup %Y-%m-%d.PKL", **kwargs):
         """
@@ -294,7 +302,7 @@ class PickleBackupTodoistAPI(DaemonTask):
             self.log(f"Skipping Todoist backup because file already exists: '{filename}'...", color="green")
             return
         self.log(f"Pickling Todoist API... writing to '{filename}'...", end="\t")
-        pickle.dump(todoist, open(filename, "wb"))
+        pickle.dump(todoist_resource.get(), open(filename, "wb"))
         self.log("Done", start="", color="green")
 
     def should_run(self):
@@ -303,6 +311,7 @@ class PickleBackupTodoistAPI(DaemonTask):
 
 class KindleImport(DaemonTask):
     """Import vocabulary from USB-connected kindle, store in ew Todoist project"""
+    requires = [todoist_resource, kindle_imported_words]
 
     def __init__(self, filename: str = "Todoist API Backup %Y-%m-%d.PKL", **kwargs):
         """
@@ -313,10 +322,10 @@ class KindleImport(DaemonTask):
         self.callsign = "Kindle Import"
         self.interval = 10
         self.kindle_file = r"Z:\system\vocabulary\vocab.db" if os_name == "Windows" else "/media/robin/Kindle/system/vocabulary/vocab.db"
-        self.done_folder = os.path.join(project_dir, ".files", "kindle imported vocab")
+        self.done_folder = KINDLE_DONE_FOLDER
         self.filename = filename
         self.project_id = 2274744021  # 2273641852
-        self.load_imported()
+        self.imported_words = kindle_imported_words.get()
 
     def task(self):
         # check if kindle is connected
@@ -362,8 +371,5 @@ class KindleImport(DaemonTask):
 
     def load_imported(self):
         """load all the already imported words"""
-        with os.scandir(self.done_folder) as files:
-            files = [open(file.path, "r", encoding="utf-8").read().split("\n") for file in files]
-            self.imported_words = list(set([x.strip() for file in files for x in file if (x and not x[0] == "#")]))
-        self.task()
+        self.imported_words = read_word_files(self.done_folder)
 
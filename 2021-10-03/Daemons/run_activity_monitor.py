@@ -0,0 +1,11 @@
+import time
+from shared.classes import ActivityMonitor, ProfilingControl
+from shared.registry import DaemonRegistry
+
+# samples the active window for the runners started with DAEMONS_SHARED_ACTIVITY=1, so it's sampled once however many runner processes there are
+daemon_registry = DaemonRegistry([ActivityMonitor(publish=True), ProfilingControl()])
+daemon_registry.start()
+
+while True:
+    daemon_registry.run()
+    time.sleep(1)
@@ -1,18 +1,19 @@
 import time
-from shared.classes import ActivityMonitor
+from shared.classes import create_activity_monitor, MetricsDaemon, ProfilingControl
+from shared.registry import DaemonRegistry
 from run_hue_daemons import daemons as hue_daemons
 from run_todoist_daemon import daemons as todoist_daemons
 from run_miscellaneous_daemons import daemons as miscellaneous_daemons
 
+# only declared so far: the Todoist data and the Hue bridge are loaded at the same time, in the background
 daemons = todoist_daemons + miscellaneous_daemons + hue_daemons
 
-
-# tell all daemons to use the same ActivityMonitor instance
-activity_monitor = ActivityMonitor()
-[daemon.set_activity_monitor(activity_monitor) for daemon in daemons]
-daemons.append(activity_monitor)
+# all daemons use the same ActivityMonitor instance, see create_activity_monitor() for sharing it between processes
+daemon_registry = DaemonRegistry(daemons, activity_monitor=create_activity_monitor())
+daemon_registry.add(MetricsDaemon())
+daemon_registry.add(ProfilingControl())
+daemon_registry.start()
 
 while True:
-    for daemon in daemons:
-        daemon.run()
+    daemon_registry.run()
     time.sleep(1)
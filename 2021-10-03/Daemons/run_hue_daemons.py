@@ -1,16 +1,18 @@
 import time
 from daemons.hue import *
-from shared.classes import ActivityMonitor
+from shared.classes import create_activity_monitor, MetricsDaemon, ProfilingControl
+from shared.registry import Resource, declare, DaemonRegistry
 
-hue = HueInterface()
-daemons = [HueReactToMovieWatching(hue=hue), HueAdjuster(hue=hue)]
+# the bridge is contacted in the background, the daemons are created once it answered
+hue = Resource("Hue bridge", HueInterface)
+daemons = [declare(HueReactToMovieWatching, hue=hue), declare(HueAdjuster, hue=hue)]
 
 if __name__ == "__main__":
-    activity_monitor = ActivityMonitor()
-    # tell all daemons to use the same ActivityMonitor instance
-    [daemon.set_activity_monitor(activity_monitor) for daemon in daemons]
-    daemons.append(activity_monitor)
+    # all daemons use the same ActivityMonitor instance, see create_activity_monitor() for sharing it between processes
+    daemon_registry = DaemonRegistry(daemons, activity_monitor=create_activity_monitor())
+    daemon_registry.add(MetricsDaemon())
+    daemon_registry.add(ProfilingControl())
+    daemon_registry.start()
     while True:
-        for daemon in daemons:
-            daemon.run()
+        daemon_registry.run()
         time.sleep(1)
@@ -1,16 +1,17 @@
 import time
-from shared.classes import ActivityMonitor
+from shared.classes import create_activity_monitor, MetricsDaemon, ProfilingControl
+from shared.registry import declare, DaemonRegistry
 from daemons.miscellaneous import DictccCrawler, MonitorVPN
 
-daemons = [DictccCrawler(list_name="Wörter"), MonitorVPN()]
+# the crawler state is loaded in the background, like the resources of the other runners
+daemons = [declare(DictccCrawler, list_name="Wörter", last_list=DictccCrawler.state("Wörter")), declare(MonitorVPN)]
 
 if __name__ == "__main__":
-    activity_monitor = ActivityMonitor()
-    # tell all daemons to use the same ActivityMonitor instance
-    [daemon.set_activity_monitor(activity_monitor) for daemon in daemons]
-
-    daemons.append(activity_monitor)
+    # all daemons use the same ActivityMonitor instance, see create_activity_monitor() for sharing it between processes
+    daemon_registry = DaemonRegistry(daemons, activity_monitor=create_activity_monitor())
+    daemon_registry.add(MetricsDaemon())
+    daemon_registry.add(ProfilingControl())
+    daemon_registry.start()
     while True:
-        for daemon in daemons:
-            daemon.run()
+        daemon_registry.run()
         time.sleep(1)
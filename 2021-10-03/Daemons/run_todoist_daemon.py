@@ -1,16 +1,18 @@
+import time
 from daemons.todoist import *
-from shared.classes import ActivityMonitor
+from shared.classes import create_activity_monitor, MetricsDaemon, ProfilingControl
+from shared.registry import declare, DaemonRegistry
 
-daemons = [SyncTodoistAPI(), ListDaemon("Englisch"), ListDaemon("Deutsch"), ListDaemon("Goodreads"), ListDaemon("Googlen"), ListDaemon("Linux"), ListDaemon("Two days"), ListDaemon("Windows"), UnusedProjects(),
-           PickleBackupTodoistAPI(), BookQuoteDaemon(), KindleImport()]
+daemons = [declare(SyncTodoistAPI), declare(ListDaemon, "Englisch"), declare(ListDaemon, "Deutsch"), declare(ListDaemon, "Goodreads"), declare(ListDaemon, "Googlen"),
+           declare(ListDaemon, "Linux"), declare(ListDaemon, "Two days"), declare(ListDaemon, "Windows"), declare(UnusedProjects), declare(PickleBackupTodoistAPI),
+           declare(BookQuoteDaemon), declare(KindleImport)]
 
 if __name__ == "__main__":
-    activity_monitor = ActivityMonitor()
-    # tell all daemons to use the same ActivityMonitor instance
-    [daemon.set_activity_monitor(activity_monitor) for daemon in daemons]
-    daemons.append(activity_monitor)
-
+    # all daemons use the same ActivityMonitor instance, see create_activity_monitor() for sharing it between processes
+    daemon_registry = DaemonRegistry(daemons, activity_monitor=create_activity_monitor())
+    daemon_registry.add(MetricsDaemon())
+    daemon_registry.add(ProfilingControl())
+    daemon_registry.start()
     while True:
-        for daemon in daemons:
-            daemon.run()
+        daemon_registry.run()
         time.sleep(1)
@@ -0,0 +1,111 @@
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+ACTIVITY_MEMORY_FILE = os.path.join(tempfile.gettempdir(), "daemons-activity.mmap")
+RING_SIZE = 20 * 60  # samples, 20 minutes at one per second
+MAGIC = b"ACT1"
+# magic, ring size, sequence number, samples written in total, sampling interval, time and idle seconds of the last sample
+HEADER = struct.Struct("<4sIQQddd")
+SEQUENCE = struct.Struct("<Q")
+SEQUENCE_OFFSET = 8
+SAMPLE_INFO = struct.Struct("<Qddd")  # the fields after the sequence number
+SAMPLE_INFO_OFFSET = 16
+STALE_SECONDS = 10  # samples older than this (times the interval) mean the sampler process isn't running
+
+
+class ActivityPublisher:
+    """Writes the classified samples of the ActivityMonitor to a ring in a memory mapped file, so daemons in other processes can read them.
+    Guarded by a seqlock: the sequence number is odd while a sample is written, readers retry until they got a copy with the same even number before and after.
+    There must only be one publisher (run_activity_monitor.py)"""
+
+    def __init__(self, interval: float, path: str = ACTIVITY_MEMORY_FILE):
+        self.interval = interval
+        self.size = HEADER.size + RING_SIZE
+        # not truncated: readers may still have the file of the last sampler mapped
+        descriptor = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(descriptor).st_size != self.size:
+            os.ftruncate(descriptor, self.size)
+        self.memory = mmap.mmap(descriptor, self.size)
+        os.close(descriptor)
+
+        magic, ring_size, sequence, *_ = HEADER.unpack_from(self.memory)
+        if magic != MAGIC or ring_size != RING_SIZE:
+            sequence = 0
+        # start with an empty ring: the samples of the last sampler can be hours old. Marked as being written (odd) until it's cleared
+        sequence += 1 - sequence % 2
+        SEQUENCE.pack_into(self.memory, SEQUENCE_OFFSET, sequence)
+        self.memory[HEADER.size:] = bytes(RING_SIZE)
+        self.count = 0
+        SAMPLE_INFO.pack_into(self.memory, SAMPLE_INFO_OFFSET, self.count, self.interval, 0, 0)
+        self.memory[:SEQUENCE_OFFSET] = struct.pack("<4sI", MAGIC, RING_SIZE)
+        self.sequence = sequence + 1
+        SEQUENCE.pack_into(self.memory, SEQUENCE_OFFSET, self.sequence)
+
+    def publish(self, categories: int, idle_seconds: float):
+        """Add a sample
+        :param categories: bitmask of the activity categories of the active window"""
+        SEQUENCE.pack_into(self.memory, SEQUENCE_OFFSET, self.sequence + 1)
+        self.memory[HEADER.size + self.count % RING_SIZE] = categories
+        self.count += 1
+        SAMPLE_INFO.pack_into(self.memory, SAMPLE_INFO_OFFSET, self.count, self.interval, time.time(), idle_seconds)
+        # written last, so readers only see an even number once everything else is complete
+        self.sequence += 2
+        SEQUENCE.pack_into(self.memory, SEQUENCE_OFFSET, self.sequence)
+
+
+class ActivitySnapshot:
+    """Consistent copy of the published samples"""
+
+    def __init__(self, data: bytes):
+        _, _, _, self.count, self.interval, self.sample_time, self.idle_seconds = HEADER.unpack_from(data)
+        self.ring = data[HEADER.size:]
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() - self.sample_time < STALE_SECONDS * max(self.interval, 1)
+
+    def samples(self) -> [int]:
+        """The category bitmasks, oldest first"""
+        if self.count <= RING_SIZE:
+            return list(self.ring[:self.count])
+        start = self.count % RING_SIZE
+        return list(self.ring[start:] + self.ring[:start])
+
+
+class ActivityReader:
+    """Reads the samples of the ActivityPublisher without any lock"""
+
+    def __init__(self, path: str = ACTIVITY_MEMORY_FILE):
+        self.path = path
+        self.memory = None
+
+    def open(self) -> bool:
+        if self.memory is None:
+            try:
+                with open(self.path, "rb") as file:
+                    if os.fstat(file.fileno()).st_size < HEADER.size + RING_SIZE:
+                        return False
+                    self.memory = mmap.mmap(file.fileno(), HEADER.size + RING_SIZE, access=mmap.ACCESS_READ)
+            except OSError:
+                return False
+            if HEADER.unpack_from(self.memory)[:2] != (MAGIC, RING_SIZE):
+                self.memory = None
+        return self.memory is not None
+
+    def snapshot(self, retries: int = 100):
+        """Return an ActivitySnapshot, or None if no sampler has published anything"""
+        if not self.open():
+            return None
+        for _ in range(retries):
+            before = SEQUENCE.unpack_from(self.memory, SEQUENCE_OFFSET)[0]
+            if before % 2:
+                # the publisher is writing a sample right now
+                time.sleep(0)
+                continue
+            data = self.memory[:]
+            if SEQUENCE.unpack_from(self.memory, SEQUENCE_OFFSET)[0] == before:
+                return ActivitySnapshot(data)
+        return None
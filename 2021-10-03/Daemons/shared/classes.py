@@ -2,13 +2,19 @@ from datetime import datetime as datetime2
 from termcolor import colored
 import datetime
 import traceback
+import time
 import os
 from shared.utils import has_internet_connection, active_window, get_user_idle_duration
+from shared.metrics import registry, METRICS_PORT
+from shared.profiling import profiler
+from shared.activity_memory import ActivityPublisher, ActivityReader
 
 
 class DaemonTask:
     """Parent class of all daemons that handles running them at certain intervals and formatting the log output"""
 
+    requires = []  # Resources (shared.registry) that have to be ready before the DaemonRegistry creates the daemon
+
     def __init__(self, callsign=None, interval=None, silent=True, need_internet=True):
         self.callsign = callsign
         self.interval = interval
@@ -17,27 +23,45 @@ class DaemonTask:
         self.silent = silent
         self.need_internet = need_internet
         self.activity_monitor = None
+        self.metrics = None  # created on the first run, the subclasses set the callsign after calling this
 
     def run(self):
         # run every %interval seconds if self.should_run is true (default)
+        if self.metrics is None:
+            self.metrics = registry.daemon(self.callsign)
 
         # skip this run if there is no internet but it's needed
         if self.need_internet and not has_internet_connection():
+            self.metrics.offline_skips += 1
             return
 
         if (self.interval and (now := datetime2.now().timestamp()) - self.last_run) > self.interval:
             if not self.should_run():
                 # skip this run because the algorithm says so
+                self.metrics.skips += 1
                 self.last_run = now
                 return
             if not self.silent:
                 print(f"Führe {self.callsign.upper()} aus")
+            # how much later than planned the task starts (the loop is busy with other daemons' tasks)
+            lag = max(0.0, now - self.last_run - self.interval) if self.last_run else 0.0
+            error = None
+            registry.current.metrics = self.metrics
+            # profile this run if it has been requested. Daemons without callsign can't be requested
+            capture = profiler.start(self.callsign) if profiler.requests and self.callsign else None
+            start = time.perf_counter()
             try:
                 self.task()
                 self.last_task_run = datetime2.now().timestamp()
             except Exception as e:
+                error = e
                 print(e)
                 print(traceback.format_exc())
+            finally:
+                registry.current.metrics = None
+                if capture:
+                    profiler.stop(capture)
+            self.metrics.observe_run(time.perf_counter() - start, lag, error)
             self.last_run = now
             return True
 
@@ -85,42 +109,134 @@ class DaemonTask:
         self.activity_monitor = activity_monitor
 
 
+class MetricsDaemon(DaemonTask):
+    """Serve the metrics of all daemons of this process in Prometheus format and log a summary line every %interval seconds"""
+
+    def __init__(self, port: int = METRICS_PORT, **kwargs):
+        super(MetricsDaemon, self).__init__(**kwargs)
+        self.callsign = "Metrics"
+        self.interval = 600
+        self.need_internet = False
+        if registry.serve(port):
+            self.log(f"Metrics on http://127.0.0.1:{port}/metrics", color="green")
+        else:
+            self.log(f"Port {port} is taken, metrics are only logged", color="red")
+
+    def task(self):
+        if self.last_run:
+            self.log(registry.summary())
+
+
+class ProfilingControl(DaemonTask):
+    """Start profiling daemons when they are requested in the control file (.log/profile, one "CALLSIGN [runs] [cprofile|sample]" per line).
+    On POSIX, SIGUSR1 makes it read the file right away. Profiles can also be requested on the metrics endpoint: /profile?daemon=CALLSIGN"""
+
+    def __init__(self, **kwargs):
+        super(ProfilingControl, self).__init__(**kwargs)
+        self.callsign = "Profiling"
+        self.interval = 5
+        self.need_internet = False
+        profiler.install_signal_handler()
+
+    def task(self):
+        profiler.read_control_file()
+
+
 class ActivityMonitor(DaemonTask):
     """keep track of what the user is doing and analyze it to help daemons act according to user activity"""
 
-    def __init__(self, **kwargs):
+    def __init__(self, publish: bool = False, **kwargs):
+        """
+        :param publish: write the samples to shared memory for the SharedActivityMonitor of other processes (only in run_activity_monitor.py)
+        """
         super(ActivityMonitor, self).__init__(**kwargs)
         self.callsign = "Activity"
         self.interval = 1
         self.need_internet = False
-        self.activity_log = []  # every second, the title of the active window is stored in here
+        self.activity_log = []  # every second, the activity categories of the active window are stored in here, as bitmask
         self.activity_indicators = {"movie": ["MPC", "VLC media player"],
                                     "coding": [".py", "Visual Studio Code"],
                                     "gaming": ["Minecraft"]}
+        self.category_bits = {category: 1 << i for i, category in enumerate(self.activity_indicators)}
+        self.publisher = ActivityPublisher(self.interval) if publish else None
+
+    def classify(self, window_title: str) -> int:
+        """Return the bitmask of the activity categories the window title belongs to"""
+        return sum(bit for category, bit in self.category_bits.items() if any(x in window_title for x in self.activity_indicators[category]))
+
+    def category_mask(self, activities: str) -> int:
+        """Bitmask of the activity categories seperated by comma ("all" for every category)"""
+        if activities == "all":
+            return sum(self.category_bits.values())
+        return sum(self.category_bits[activity_name] for activity_name in activities.split(","))
 
     def task(self):
         """truncate stored activity and add current active window to record"""
-        # Todo: check whether title counts as activity type and store that information. save tons of cpu
+        categories = self.classify(active_window())
 
         # truncate activity log (only keep records of last 20 minutes)
         self.activity_log = self.activity_log[int(-20 * (60 / self.interval)):]
-        self.activity_log.append(active_window())
+        self.activity_log.append(categories)
+        if self.publisher:
+            self.publisher.publish(categories, self.idle_seconds())
 
     def evaluate_activity(self, activities: str = None, percentage: int = 50, minutes=20):
         """Check whether the given activity has been preeminent within supervised time period
         :param activities:  the activity category to check for seperated by comma as string (gaming, movie or coding) or "all"
         :param percentage: minimum percentage of time that activity must have taken up
         :param minutes: the duration of activity tracking data to check against"""
+        return self.count_activity(self.activity_log, activities, percentage, minutes)
 
-        if activities == "all":
-            window_titles = [activity for category in self.activity_indicators.values() for activity in category]
-        else:
-            window_titles = [window_title for activity_name in activities.split(",") for window_title in self.activity_indicators[activity_name]]
-
-        monitor_period = self.activity_log[int(-minutes * (60 / self.interval)):]
+    def count_activity(self, activity_log: [int], activities: str, percentage: int, minutes) -> bool:
+        mask = self.category_mask(activities)
+        monitor_period = activity_log[int(-minutes * (60 / self.interval)):]
 
-        return sum([1 if any([x in _active_window for x in window_titles]) else 0 for _active_window in monitor_period]) > len(self.activity_log) * (percentage / 100)
+        return sum([1 if categories & mask else 0 for categories in monitor_period]) > len(activity_log) * (percentage / 100)
 
     def idle_seconds(self):
         """Return the seconds since last user input"""
         return get_user_idle_duration()
+
+
+class SharedActivityMonitor(ActivityMonitor):
+    """ActivityMonitor of a runner process that reads the samples run_activity_monitor.py publishes in shared memory, instead of sampling the active window itself.
+    Samples locally as long as that process isn't running"""
+
+    def __init__(self, **kwargs):
+        super(SharedActivityMonitor, self).__init__(**kwargs)
+        self.reader = ActivityReader()
+        self.shared = None  # the last snapshot, while the sampler process is running
+
+    def task(self):
+        snapshot = self.reader.snapshot()
+        if snapshot is not None and snapshot.fresh:
+            if self.shared is None:
+                self.log("Reading the activity of the shared sampler", color="green")
+            self.shared = snapshot
+            self.activity_log = []
+            return
+        if self.shared is not None:
+            self.log("Shared activity sampler stopped, sampling in this process", color="red")
+            self.shared = None
+        super(SharedActivityMonitor, self).task()
+
+    def evaluate_activity(self, activities: str = None, percentage: int = 50, minutes=20):
+        if self.shared is None:
+            return super(SharedActivityMonitor, self).evaluate_activity(activities, percentage, minutes)
+        # read the latest samples, the task only runs once per interval
+        snapshot = self.reader.snapshot() or self.shared
+        return self.count_activity(snapshot.samples(), activities, percentage, minutes)
+
+    def idle_seconds(self):
+        if self.shared is None:
+            return super(SharedActivityMonitor, self).idle_seconds()
+        snapshot = self.reader.snapshot() or self.shared
+        return snapshot.idle_seconds + time.time() - snapshot.sample_time
+
+
+def create_activity_monitor() -> ActivityMonitor:
+    """The ActivityMonitor for the daemons of a runner process. With the environment variable DAEMONS_SHARED_ACTIVITY=1, the runners read the samples
+    of run_activity_monitor.py, so the active window is sampled once no matter how many runner processes there are"""
+    if os.environ.get("DAEMONS_SHARED_ACTIVITY") == "1":
+        return SharedActivityMonitor()
+    return ActivityMonitor()
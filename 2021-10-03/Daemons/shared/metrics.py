@@ -0,0 +1,165 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+METRICS_PORT = 9464  # http://127.0.0.1:9464/metrics
+DURATION_BUCKETS = [0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300]  # upper bounds of the run duration histogram, in seconds
+
+
+class DaemonMetrics:
+    """Runtime statistics of one daemon: how long its task takes, how late it starts, how often it's skipped or fails and how many requests it makes"""
+
+    def __init__(self, callsign: str):
+        self.callsign = callsign
+        self.runs = 0
+        self.failures = 0
+        self.skips = 0  # should_run() said no
+        self.offline_skips = 0  # loop ticks skipped because there was no internet connection
+        self.network_calls = 0
+        self.duration_buckets = [0] * len(DURATION_BUCKETS)  # not cumulative, summed up when exported
+        self.duration_sum = 0.0
+        self.duration_max = 0.0
+        self.lag = 0.0  # how much later than its interval the last run started
+        self.lag_max = 0.0
+        self.last_error = None
+        self.last_error_time = None
+        self.summarized_runs, self.summarized_duration = 0, 0.0  # state at the last summary line
+
+    def observe_run(self, duration: float, lag: float, error: Exception = None):
+        self.runs += 1
+        self.duration_sum += duration
+        self.duration_max = max(self.duration_max, duration)
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if duration <= bound:
+                self.duration_buckets[i] += 1
+                break
+        self.lag = lag
+        self.lag_max = max(self.lag_max, lag)
+        if error is not None:
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+            self.last_error_time = time.time()
+
+
+class MetricsRegistry:
+    """Metrics of all daemons of this process"""
+
+    def __init__(self):
+        self.daemons: {str: DaemonMetrics} = {}
+        self.lock = threading.Lock()
+        self.current = threading.local()  # metrics of the daemon whose task is running in this thread
+        self.server = None
+        self.routes = {"/metrics": lambda query: self.prometheus_text()}  # path: function(query parameters) returning the response text
+
+    def daemon(self, callsign: str) -> DaemonMetrics:
+        with self.lock:
+            if callsign not in self.daemons:
+                self.daemons[callsign] = DaemonMetrics(callsign)
+            return self.daemons[callsign]
+
+    def prometheus_text(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            daemons = list(self.daemons.values())
+        lines = []
+
+        def metric(name: str, kind: str, help: str, values):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(values)
+
+        def label(value) -> str:
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        for name, attribute, help in [["daemon_runs_total", "runs", "Finished task runs"], ["daemon_failures_total", "failures", "Task runs that raised an exception"],
+                                      ["daemon_skips_total", "skips", "Due runs skipped by should_run()"],
+                                      ["daemon_offline_skips_total", "offline_skips", "Loop ticks skipped because there was no internet connection"],
+                                      ["daemon_network_calls_total", "network_calls", "HTTP requests made by the task"]]:
+            metric(name, "counter", help, [f'{name}{{daemon="{label(d.callsign)}"}} {getattr(d, attribute)}' for d in daemons])
+
+        histogram = []
+        for d in daemons:
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, d.duration_buckets):
+                cumulative += count
+                histogram.append(f'daemon_run_duration_seconds_bucket{{daemon="{label(d.callsign)}",le="{bound}"}} {cumulative}')
+            histogram.append(f'daemon_run_duration_seconds_bucket{{daemon="{label(d.callsign)}",le="+Inf"}} {d.runs}')
+            histogram.append(f'daemon_run_duration_seconds_sum{{daemon="{label(d.callsign)}"}} {d.duration_sum:.6f}')
+            histogram.append(f'daemon_run_duration_seconds_count{{daemon="{label(d.callsign)}"}} {d.runs}')
+        metric("daemon_run_duration_seconds", "histogram", "Duration of task runs", histogram)
+
+        metric("daemon_schedule_lag_seconds", "gauge", "How much later than its interval the last run started", [f'daemon_schedule_lag_seconds{{daemon="{label(d.callsign)}"}} {d.lag:.3f}' for d in daemons])
+        metric("daemon_schedule_lag_max_seconds", "gauge", "Largest schedule lag so far", [f'daemon_schedule_lag_max_seconds{{daemon="{label(d.callsign)}"}} {d.lag_max:.3f}' for d in daemons])
+        metric("daemon_last_error_timestamp_seconds", "gauge", "Time of the last failure",
+               [f'daemon_last_error_timestamp_seconds{{daemon="{label(d.callsign)}"}} {d.last_error_time:.0f}' for d in daemons if d.last_error_time])
+        metric("daemon_last_error_info", "gauge", "Last exception of the task",
+               [f'daemon_last_error_info{{daemon="{label(d.callsign)}",error="{label(d.last_error[:200])}"}} 1' for d in daemons if d.last_error])
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """One line with the daemons that took the most time since the last summary"""
+        with self.lock:
+            daemons = list(self.daemons.values())
+        parts = []
+        for d in sorted(daemons, key=lambda d: d.summarized_duration - d.duration_sum):
+            runs, duration = d.runs - d.summarized_runs, d.duration_sum - d.summarized_duration
+            d.summarized_runs, d.summarized_duration = d.runs, d.duration_sum
+            if runs:
+                parts.append(f"{d.callsign} {runs}x {duration:.1f}s" + (f" (lag max {d.lag_max:.0f}s)" if d.lag_max >= 1 else "") + (f", {d.failures} failed" if d.failures else ""))
+        return " | ".join(parts) or "no runs"
+
+    def serve(self, port: int = METRICS_PORT) -> bool:
+        """Serve the metrics on http://127.0.0.1:%port/metrics (and the other routes) in a background thread. Returns False if the port is taken (e.g. by another daemon process)"""
+        if self.server:
+            return True
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path not in registry.routes:
+                    self.send_error(404)
+                    return
+                try:
+                    body = registry.routes[url.path](dict(parse_qsl(url.query))).encode("utf-8")
+                except ValueError as e:
+                    self.send_error(400, str(e))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        except OSError:
+            return False
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return True
+
+
+registry = MetricsRegistry()
+
+
+def count_network_calls():
+    """Count every request made through requests (the Todoist API uses it too) for the daemon whose task is running"""
+    try:
+        from requests.sessions import Session
+    except ImportError:
+        return
+    send = Session.send
+
+    def counting_send(session, request, **kwargs):
+        if (metrics := getattr(registry.current, "metrics", None)) is not None:
+            metrics.network_calls += 1
+        return send(session, request, **kwargs)
+
+    Session.send = counting_send
+
+
+count_network_calls()
@@ -0,0 +1,138 @@
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import threading
+from collections import Counter
+from datetime import datetime as datetime2
+from shared.metrics import registry
+
+PROFILE_FOLDER = os.path.join(".log", "profiles")
+CONTROL_FILE = os.path.join(".log", "profile")  # one request per line: CALLSIGN [runs] [cprofile|sample]
+DEFAULT_RUNS = 3
+SAMPLE_INTERVAL = 0.005  # seconds between two stack samples
+MODES = ["cprofile", "sample"]
+
+
+class Capture:
+    """Profile of the next %runs task runs of one daemon.
+    cprofile records every call (pstats output, for snakeviz, gprof2dot or flameprof). sample records the stack every SAMPLE_INTERVAL seconds
+    with less overhead and writes it as collapsed stacks, the input format of flamegraph.pl and speedscope"""
+
+    def __init__(self, callsign: str, runs: int = DEFAULT_RUNS, mode: str = "cprofile"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode}, choose one of {MODES}")
+        self.callsign = callsign
+        self.runs = runs
+        self.mode = mode
+        self.finished_runs = 0
+        self.profile = cProfile.Profile() if mode == "cprofile" else None
+        self.stacks = Counter()
+        self.sampling = None  # stop event and thread of the sampling run
+
+    def start(self):
+        if self.profile:
+            self.profile.enable()
+        else:
+            stop = threading.Event()
+            self.sampling = (stop, threading.Thread(target=self.sample, args=(threading.get_ident(), stop), daemon=True))
+            self.sampling[1].start()
+
+    def stop(self) -> bool:
+        """Stop profiling this run. Returns True once all runs have been captured"""
+        if self.profile:
+            self.profile.disable()
+        else:
+            self.sampling[0].set()
+            self.sampling[1].join()
+        self.finished_runs += 1
+        return self.finished_runs >= self.runs
+
+    def sample(self, thread_id: int, stop: threading.Event):
+        """Record the stack of the thread running the task until stop is set"""
+        while not stop.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stop.is_set():
+                # the task has finished, the stack belongs to something else
+                break
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def dump(self) -> str:
+        """Write the profile to PROFILE_FOLDER and return its path"""
+        os.makedirs(PROFILE_FOLDER, exist_ok=True)
+        path = os.path.join(PROFILE_FOLDER, f"{self.callsign.upper()} {datetime2.now().strftime('%Y-%m-%d %H-%M-%S')}")
+        if self.profile:
+            self.profile.dump_stats(path + ".prof")
+            with open(path + ".txt", "w", encoding="utf-8") as file:
+                pstats.Stats(self.profile, stream=file).sort_stats("cumulative").print_stats(50)
+            return path + ".prof"
+        with open(path + ".folded", "w", encoding="utf-8") as file:
+            file.write("".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()))
+        return path + ".folded"
+
+
+class Profiler:
+    """Profiling requests for daemons, by callsign. While there are none, DaemonTask.run() only checks whether the dict is empty"""
+
+    def __init__(self):
+        self.requests: {str: Capture} = {}
+        self.lock = threading.RLock()  # the signal handler can interrupt the main thread while it holds the lock
+
+    def request(self, callsign: str, runs: int = DEFAULT_RUNS, mode: str = "cprofile") -> Capture:
+        """Profile the next %runs runs of the daemon with the callsign (case insensitive)"""
+        capture = Capture(callsign, runs, mode)
+        with self.lock:
+            self.requests[callsign.upper()] = capture
+        print(f"Profiling the next {runs} runs of {callsign.upper()} ({mode})")
+        return capture
+
+    def start(self, callsign: str) -> Capture:
+        """Start capturing a run of the daemon if it's requested, return the capture or None"""
+        with self.lock:
+            capture = self.requests.get(callsign.upper())
+        if capture:
+            capture.start()
+        return capture
+
+    def stop(self, capture: Capture):
+        """Stop capturing the run. After the last requested run, write the profile and switch profiling off for the daemon"""
+        if not capture.stop():
+            return
+        with self.lock:
+            if self.requests.get(capture.callsign.upper()) is capture:
+                del self.requests[capture.callsign.upper()]
+        print(f"Profile of {capture.callsign.upper()} written to {capture.dump()}")
+
+    def read_control_file(self, path: str = CONTROL_FILE):
+        """Request the profiles listed in the control file, then delete it"""
+        if not os.path.isfile(path):
+            return
+        with open(path, "r", encoding="utf-8") as file:
+            lines = [line.split() for line in file if line.strip()]
+        os.remove(path)
+        for line in lines:
+            # callsigns can contain spaces, so runs and mode are taken from the end
+            mode = line.pop() if len(line) > 1 and line[-1] in MODES else "cprofile"
+            runs = int(line.pop()) if len(line) > 1 and line[-1].isdigit() else DEFAULT_RUNS
+            self.request(" ".join(line), runs, mode)
+
+    def handle_http(self, query: dict) -> str:
+        """/profile?daemon=CALLSIGN&runs=3&mode=sample on the metrics endpoint"""
+        if "daemon" not in query:
+            return "usage: /profile?daemon=CALLSIGN&runs=3&mode=cprofile|sample\n"
+        capture = self.request(query["daemon"], int(query.get("runs", DEFAULT_RUNS)), query.get("mode", "cprofile"))
+        return f"profiling the next {capture.runs} runs of {capture.callsign.upper()}\n"
+
+    def install_signal_handler(self):
+        """Read the control file right away on SIGUSR1 (POSIX only), e.g. echo "ARCHIVING 5" > .log/profile && kill -USR1 <pid>"""
+        if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.read_control_file())
+
+
+profiler = Profiler()
+registry.routes["/profile"] = profiler.handle_http
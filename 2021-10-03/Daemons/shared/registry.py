@@ -0,0 +1,142 @@
+import threading
+import time
+import traceback
+from termcolor import colored
+
+RESOURCE_RETRY_SECONDS = 30  # wait this long before trying to create a failed resource again
+
+
+class Resource:
+    """A shared object or state that is slow to create (the synced Todoist API, the Hue bridge interface, the Dict.cc crawler state). Created once, in a background thread, when the registry starts.
+    Daemons that need it are only created after it's ready, and from then on it's only used from the main thread"""
+
+    def __init__(self, name: str, factory, *args, **kwargs):
+        self.name = name
+        self.factory = factory
+        self.args, self.kwargs = args, kwargs
+        self.value = None
+        self.ready = threading.Event()
+        self.started = False
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Create the object in a background thread, unless that already happened"""
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        threading.Thread(target=self.create, name=f"Resource {self.name}", daemon=True).start()
+
+    def create(self):
+        start = time.time()
+        while True:
+            try:
+                self.value = self.factory(*self.args, **self.kwargs)
+                break
+            except Exception as e:
+                print(colored(f"Creating {self.name} failed, trying again in {RESOURCE_RETRY_SECONDS} s: {e}", "red"))
+                print(traceback.format_exc())
+                time.sleep(RESOURCE_RETRY_SECONDS)
+        print(colored(f"{self.name} ready after {time.time() - start:.1f} s", "green"))
+        self.ready.set()
+
+    def get(self):
+        """Return the object, waiting until it's created. Starts creating it if nobody has yet (e.g. when a module is used on its own)"""
+        if not self.ready.is_set():
+            self.start()
+            self.ready.wait()
+        return self.value
+
+    def proxy(self):
+        return LazyProxy(self)
+
+
+class LazyProxy:
+    """Stands in for the object of a resource, so modules can refer to it from the start (todoist.sync()). Every attribute access waits until it's ready"""
+
+    def __init__(self, resource: Resource):
+        object.__setattr__(self, "_resource", resource)
+
+    def __getattr__(self, name):
+        return getattr(self._resource.get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._resource.get(), name, value)
+
+
+class Declared:
+    """A daemon that will be created once the resources it needs are ready: the class' %requires and any Resource among the arguments,
+    which are replaced by their objects"""
+
+    def __init__(self, daemon_class, *args, **kwargs):
+        self.daemon_class = daemon_class
+        self.args, self.kwargs = args, kwargs
+
+    def resources(self) -> [Resource]:
+        arguments = [*self.args, *self.kwargs.values()]
+        return list(getattr(self.daemon_class, "requires", [])) + [x for x in arguments if isinstance(x, Resource)]
+
+    def create(self):
+        resolve = lambda x: x.get() if isinstance(x, Resource) else x
+        return self.daemon_class(*[resolve(x) for x in self.args], **{k: resolve(v) for k, v in self.kwargs.items()})
+
+    def __str__(self):
+        return self.daemon_class.__name__ + (f" {self.args[0]}" if self.args and isinstance(self.args[0], str) else "")
+
+
+def declare(daemon_class, *args, **kwargs) -> Declared:
+    """Declare a daemon without creating it. Arguments are passed to the constructor"""
+    return Declared(daemon_class, *args, **kwargs)
+
+
+class DaemonRegistry:
+    """Loads the resources of the declared daemons in the background, all at the same time, and creates each daemon as soon as its resources are ready.
+    Daemons are created and run on the main thread only, so their constructors can't race with running daemons over a shared resource.
+    Daemons that were created already (ActivityMonitor, MetricsDaemon) are active right away"""
+
+    def __init__(self, daemons: list, activity_monitor=None):
+        self.activity_monitor = activity_monitor
+        self.slots = [None] * len(daemons)  # active daemons, in the declared order
+        self.pending = []  # (slot, Declared) of the daemons that haven't been created yet
+        for index, daemon in enumerate(daemons):
+            if isinstance(daemon, Declared):
+                self.pending.append((index, daemon))
+            else:
+                self.activate(index, daemon)
+        if activity_monitor is not None:
+            self.add(activity_monitor)
+
+    def add(self, daemon):
+        """Add a daemon that was created already and doesn't need the ActivityMonitor"""
+        self.slots.append(daemon)
+
+    def activate(self, index: int, daemon):
+        if self.activity_monitor is not None:
+            daemon.set_activity_monitor(self.activity_monitor)
+        self.slots[index] = daemon
+
+    def start(self):
+        """Start loading the resources of all declared daemons in the background"""
+        for resource in {resource for _, declared in self.pending for resource in declared.resources()}:
+            resource.start()
+
+    def create_ready(self):
+        """Create the declared daemons whose resources are ready"""
+        for index, declared in [(index, declared) for index, declared in self.pending if all(resource.ready.is_set() for resource in declared.resources())]:
+            self.pending.remove((index, declared))
+            try:
+                daemon = declared.create()
+            except Exception as e:
+                print(colored(f"Creating {declared} failed, it won't run: {e}", "red"))
+                print(traceback.format_exc())
+                continue
+            self.activate(index, daemon)
+
+    def active(self) -> list:
+        return [daemon for daemon in self.slots if daemon is not None]
+
+    def run(self):
+        """Create the daemons that have become ready, then run every active daemon once"""
+        self.create_ready()
+        for daemon in self.active():
+            daemon.run()
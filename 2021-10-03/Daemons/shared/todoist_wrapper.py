@@ -119,6 +119,12 @@ class Todoist:
         """@:return the number of active items in the project"""
         return len(self.items_by_project(project_id))
 
+    def small_inactive_projects(self, max_items: int = 30, min_age_days: int = 30):
+        """Return all top level projects without sections that have at least one but fewer than %max_items items, none of them younger than %min_age_days"""
+        return [x for x in self.active_projects() if
+                not x["parent_id"] and ((items := self.project_item_count(x["id"])) < max_items and items) and not any(
+                    [x < min_age_days for x in [item.age.days for item in self.items_by_project(x["id"])]]) and not self.sections_of_project(x["id"])]
+
     # Sections
 
     def list_all_sections(self):
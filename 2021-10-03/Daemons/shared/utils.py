@@ -158,6 +158,13 @@ def string_from_timedelta(tdelta) -> str:
     return f"{hours}:{minutes}:{seconds}"
 
 
+def read_word_files(folder: str) -> [str]:
+    """Return the unique words of all text files in the folder, one word per line. Lines starting with # are ignored"""
+    with os.scandir(folder) as files:
+        files = [open(file.path, "r", encoding="utf-8").read().split("\n") for file in files]
+        return list(set([x.strip() for file in files for x in file if (x and not x[0] == "#")]))
+
+
 def string_to_filename(filename, raw=False):
     """if raw is true, will delete all illegal characters. Else will replace '?' with '¿' and all others with '-'"""
     illegal_characters_in_file_names = r'"/\*?<>|:'
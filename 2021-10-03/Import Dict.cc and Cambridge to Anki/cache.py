@@ -0,0 +1,96 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from .constants import CACHE_FILE, CACHE_MAX_ENTRIES, CACHE_TTL
+
+
+def normalize_term(term: str) -> str:
+    """Normalize a term so that trivially different spellings share one cache entry"""
+    return " ".join(term.lower().split())
+
+
+class PersistentCache:
+    """SQLite backed cache for results of online lookups (Cambridge, phrasefinder), shared by all dialogs and import runs.
+    Values are stored as zlib compressed JSON. Entries expire after %ttl seconds, and the least recently used entries are evicted once there are more than %max_entries"""
+
+    def __init__(self, path: str = CACHE_FILE, ttl: int = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.con = None  # opened on first use, so a missing or locked cache file doesn't keep the add-on from loading
+
+    def connect(self) -> sqlite3.Connection:
+        """Open the database if that hasn't happened yet. Expects the lock to be held"""
+        if self.con is not None:
+            return self.con
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        con = sqlite3.connect(self.path, check_same_thread=False)
+        con.execute("""CREATE TABLE IF NOT EXISTS cache (
+                                source TEXT NOT NULL,
+                                term TEXT NOT NULL,
+                                value BLOB NOT NULL,
+                                created REAL NOT NULL,
+                                last_used REAL NOT NULL,
+                                PRIMARY KEY (source, term))""")
+        con.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+        con.commit()
+        self.con = con
+        return con
+
+    def get(self, source: str, term: str, default=None):
+        """Return the cached value for term from the given source, or default if it isn't cached or has expired"""
+        term = normalize_term(term)
+        now = time.time()
+        with self.lock:
+            row = self.connect().execute("SELECT value, created FROM cache WHERE source = ? AND term = ?", (source, term)).fetchone()
+            if row is None:
+                return default
+            if now - row[1] > self.ttl:
+                self.con.execute("DELETE FROM cache WHERE source = ? AND term = ?", (source, term))
+                self.con.commit()
+                return default
+            self.con.execute("UPDATE cache SET last_used = ? WHERE source = ? AND term = ?", (now, source, term))
+            self.con.commit()
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def set(self, source: str, term: str, value):
+        """Store value (anything json serializable) for term from the given source"""
+        term = normalize_term(term)
+        now = time.time()
+        blob = zlib.compress(json.dumps(value).encode("utf-8"))
+        with self.lock:
+            self.connect().execute("INSERT OR REPLACE INTO cache (source, term, value, created, last_used) VALUES (?, ?, ?, ?, ?)", (source, term, blob, now, now))
+            self.evict()
+            self.con.commit()
+
+    def get_or_set(self, source: str, term: str, load):
+        """Return the cached value or call load(term), cache and return its result"""
+        missing = object()
+        value = self.get(source, term, missing)
+        if value is missing:
+            value = load(term)
+            self.set(source, term, value)
+        return value
+
+    def evict(self):
+        """Delete expired entries and the least recently used ones beyond max_entries. Expects the lock to be held"""
+        self.con.execute("DELETE FROM cache WHERE created < ?", (time.time() - self.ttl,))
+        self.con.execute("DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_entries,))
+
+    def clear(self, source: str = None):
+        """Delete all entries, or only those from the given source"""
+        with self.lock:
+            self.connect()
+            if source is None:
+                self.con.execute("DELETE FROM cache")
+            else:
+                self.con.execute("DELETE FROM cache WHERE source = ?", (source,))
+            self.con.commit()
+
+
+lookup_cache = PersistentCache()
@@ -0,0 +1,62 @@
+from dataclasses import dataclass, field, asdict
+
+CAMBRIDGE_URL = "https://dictionary.cambridge.org"
+
+# markers in the html of a Cambridge dictionary page
+US_PRONUNCIATION = "us dpron-i"
+UK_PRONUNCIATION = "uk dpron-i"
+PRONUNCIATION = "dpron-i"
+AUDIO_SOURCE = 'type="audio/ogg" src="'
+AUDIO_SOURCE_END = '"/>'
+IPA_START = '<span class="ipa dipa lpr-2 lpl-1">'
+IPA_END = "/</span></span>"
+NOT_FOUND = "Die beliebtesten Suchbegriffe"  # phrase contained in the 'no results' page
+
+
+@dataclass
+class CambridgeEntry:
+    """Everything the importer needs from a Cambridge dictionary page, extracted once so the html can be thrown away"""
+    found: bool = False  # whether Cambridge knows the term at all
+    ipa: str = None  # american IPA (html span, as displayed by Cambridge)
+    audio_url: str = None  # american pronunciation (ogg)
+    uk: [[str, str]] = field(default_factory=list)  # [ipa, audio url] for every british pronunciation
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls(**d)
+
+
+def extract_pronunciation(part: str) -> (str, str):
+    """Return (ipa, audio url) from the html following a pronunciation marker, or (None, None) if either is missing"""
+    if part.find(AUDIO_SOURCE) == -1 or part.find(IPA_START) == -1:
+        return None, None
+    audio_url = part[part.find(AUDIO_SOURCE) + len(AUDIO_SOURCE):]
+    audio_url = CAMBRIDGE_URL + audio_url[:audio_url.find(AUDIO_SOURCE_END)]
+    ipa = part[part.find(IPA_START):part.find(IPA_END)]
+    return ipa, audio_url
+
+
+def parse_cambridge(html: str) -> CambridgeEntry:
+    """Extract the american and british pronunciations from the html of a Cambridge dictionary page"""
+    if not html or NOT_FOUND in html:
+        return CambridgeEntry(found=False)
+
+    entry = CambridgeEntry(found=True)
+
+    # american pronunciation
+    if (us_start := html.find(US_PRONUNCIATION)) != -1:
+        entry.ipa, entry.audio_url = extract_pronunciation(html[us_start:])
+
+    # british pronunciations, each one only up to the next pronunciation block
+    uk_start = html.find(UK_PRONUNCIATION)
+    while uk_start != -1:
+        next_start = html.find(PRONUNCIATION, uk_start + len(UK_PRONUNCIATION))
+        ipa, audio_url = extract_pronunciation(html[uk_start:next_start if next_start != -1 else len(html)])
+        if ipa:
+            entry.uk.append([ipa, audio_url])
+        uk_start = html.find(UK_PRONUNCIATION, uk_start + len(UK_PRONUNCIATION))
+
+    return entry
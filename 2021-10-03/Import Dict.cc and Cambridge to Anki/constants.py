@@ -25,7 +25,15 @@ NOTE_TYPE_FIELDS = {"Englisch", "Deutsch 1", "Bild", "Audio", "IPA", "Häufigkei
 BASE_FOLDER = r"/hdd/Software Engineering/.files/2021-09-23 Dict.cc und Cambridge Importer" if os_name == "Linux" else r"E:\.files\2021-09-23 Dict.cc und Cambridge Importer"
 DONE_FOLDER = join(BASE_FOLDER, "imported_done")
 EW_FOLDER = join(BASE_FOLDER, "dict cc crawled vocabulary", "Wörter")
+CACHE_FILE = join(BASE_FOLDER, "lookup cache.sqlite")
 MEDIA_FOLDER = r"/home/robin/.local/share/Anki2/Benutzer 1/collection.media" if os_name == "Linux" else r"Z:\Documents\AnkiData\User 1\collection.media"
 
+PREFETCH_WORKERS = 8  # parallel downloads of audio and frequencies when creating cards
+UNSUSPEND_BATCH_SIZE = 500  # cards per batch when unsuspending new cards
+
 EDIT_WORDS_SEPERATOR = "    ~    "
 EDIT_WORDS_SEPERATOR_BASIC = "~"
+
+# persistent cache of Cambridge and phrasefinder lookups
+CACHE_TTL = 90 * 86400  # seconds
+CACHE_MAX_ENTRIES = 20000
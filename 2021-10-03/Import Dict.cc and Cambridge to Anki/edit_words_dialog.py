@@ -1,14 +1,44 @@
-from aqt.qt import QDialog, QGridLayout, QTextEdit, QScrollBar, QPushButton
-from PyQt5.QtGui import QCloseEvent, QFont, QTextBlockFormat, QTextCursor
-from PyQt5.QtCore import Qt
+from aqt.qt import QDialog, QGridLayout, QTextEdit, QScrollBar, QPushButton, QWidget
+from PyQt5.QtGui import QCloseEvent, QFont, QTextBlockFormat, QTextCursor, QPainter
+from PyQt5.QtCore import Qt, QTimer, QPoint, QRectF
 from PyQt5 import QtGui
 from aqt.utils import showInfo
-from .utils import scrub_word, load_url, wait_for_internet_connection, log, get_phrasefinder
+from .utils import scrub_words, load_url, wait_for_internet_connection, log, get_phrasefinder, get_cambridge
 from aqt import mw
 from .constants import *
 from math import ceil
 
-numbers = "\n".join([str(x) for x in range(100)])
+FRAME_MS = 16  # coalesce updates of the word group indicator to one per frame
+
+
+class WordGroupGutter(QWidget):
+    """Paints the word group indicator ('----' / '////') next to the visible lines of the editor only"""
+
+    def __init__(self, editor: QTextEdit):
+        super(WordGroupGutter, self).__init__()
+        self.editor = editor
+        self.markers = []  # indicator for every line of the editor
+
+    def set_markers(self, markers: [str]):
+        self.markers = markers
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setFont(self.font())
+        painter.setPen(self.palette().color(self.foregroundRole()))
+
+        # all lines have the same height (no wrapping, one font), so start at the first visible one and step down
+        layout = self.editor.document().documentLayout()
+        offset = self.editor.viewport().geometry().top() - self.editor.verticalScrollBar().value()
+        block = self.editor.cursorForPosition(QPoint(0, 0)).block()
+        while block.isValid() and block.blockNumber() < len(self.markers):
+            rect = layout.blockBoundingRect(block)
+            top = rect.top() + offset
+            if top > self.height():
+                break
+            painter.drawText(QRectF(0, top, self.width(), rect.height()), Qt.AlignLeft | Qt.AlignVCenter, self.markers[block.blockNumber()])
+            block = block.next()
 
 
 class EditNewWordsDialog(QDialog):
@@ -21,26 +51,31 @@ class EditNewWordsDialog(QDialog):
         font = QFont()
         font.setPointSize(14)
 
-        # Textedit indicating how the program groups words based on their english side. To help with refactoring them into appropriate groups
-        self.word_groups = QTextEdit()
-        self.word_groups.setLineWrapMode(QTextEdit.NoWrap)
-        self.word_groups.setMaximumWidth(40)
-        self.word_groups.setText(numbers)
-        self.word_groups.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.word_groups.setFont(font)
-        self.word_groups.setEnabled(False)
-
         # Textedit with new english and german words, seperated by ~
         self.new_words = QTextEdit()
         self.new_words.setLineWrapMode(QTextEdit.NoWrap)
         self.new_words.setText(words)
-        self.new_words.textChanged.connect(self.words_changed)
         self.new_words.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.new_words.setFont(font)
+
+        # Indicator showing how the program groups words based on their english side. To help with refactoring them into appropriate groups
+        self.word_groups = WordGroupGutter(self.new_words)
+        self.word_groups.setFixedWidth(40)
+        self.word_groups.setFont(font)
+
+        # english side of every line, kept up to date line by line as the user types
+        self.english_words = [self.english_word(block) for block in self.blocks()]
+        self.new_words.document().contentsChange.connect(self.words_changed)
+
+        # timer to rebuild the word groups at most once per frame
+        self.word_groups_timer = QTimer()
+        self.word_groups_timer.setSingleShot(True)
+        self.word_groups_timer.setInterval(FRAME_MS)
+        self.word_groups_timer.timeout.connect(self.update_word_groups)
 
         self.sb: QScrollBar = self.new_words.verticalScrollBar()
-        self.sb.valueChanged.connect(lambda pos: self.word_groups.verticalScrollBar().setValue(pos))
-        self.new_words.setFont(font)
-        self.words_changed()
+        self.sb.valueChanged.connect(lambda pos: self.word_groups.update())
+        self.update_word_groups()
 
         # Done editing button
         self.done_button = QPushButton()
@@ -63,21 +98,42 @@ class EditNewWordsDialog(QDialog):
     def get_words(self):
         return self.new_words.toPlainText().strip()
 
-    def words_changed(self, *args):
-        """rebuild the word_groups textedit"""
+    def blocks(self, first: int = 0, last: int = None):
+        """Yield the lines (text blocks) of the words textedit from first to last, inclusive"""
+        block = self.new_words.document().findBlockByNumber(first)
+        while block.isValid() and (last is None or block.blockNumber() <= last):
+            yield block
+            block = block.next()
 
-        # extract all unique english words and assign them a number
-        word_groups = {}  # all unique words as keys, their number as values
-        english_words = [word.split(EDIT_WORDS_SEPERATOR_BASIC)[0].strip() for word in self.get_words().split("\n")]
+    @staticmethod
+    def english_word(block) -> str:
+        return block.text().split(EDIT_WORDS_SEPERATOR_BASIC)[0].strip()
 
-        for english_word in english_words:
-            if english_word not in word_groups:
-                word_groups[english_word] = len(word_groups.keys()) + 1
+    def words_changed(self, position: int, chars_removed: int, chars_added: int):
+        """update the english words of the changed lines only and schedule rebuilding the word groups"""
+        document = self.new_words.document()
+        first = document.findBlock(position).blockNumber()
+        last = document.findBlock(position + chars_added).blockNumber()
+        if last == -1:
+            last = document.blockCount() - 1
+
+        # lines that were removed or merged by the edit
+        removed_lines = len(self.english_words) - document.blockCount()
+        self.english_words[first:last + 1 + removed_lines] = [self.english_word(block) for block in self.blocks(first, last)]
+
+        if not self.word_groups_timer.isActive():
+            self.word_groups_timer.start()
 
-        word_group_content = "\n".join(["----" if x % 2 == 0 else "////" for x in [word_groups[y] for y in english_words]])
-        self.word_groups.setText(word_group_content)
+    def update_word_groups(self):
+        """rebuild the word group indicator"""
+
+        # assign all unique english words a number
+        word_groups = {}  # all unique words as keys, their number as values
+        for english_word in self.english_words:
+            if english_word not in word_groups:
+                word_groups[english_word] = len(word_groups) + 1
 
-        self.word_groups.verticalScrollBar().setValue(self.sb.value())
+        self.word_groups.set_markers(["----" if word_groups[x] % 2 == 0 else "////" for x in self.english_words])
 
     def done_(self):
         """pass unique words on to user to verify automated scrubbing output"""
@@ -109,9 +165,10 @@ class CorrectScrubbingOutput(QDialog):
         self.unique_words = unique_words
         self.parent = parent_class
 
-        self.scrubbed_words = [scrub_word(x) for x in self.unique_words]
-        self.cambridge_available_cache = {}  # for every scrubbed term, contains either the cambridge html or 'false' if term can't be found on cambridge
+        self.scrubbed_words = scrub_words(self.unique_words)
+        self.cambridge_available_cache = {}  # for every scrubbed term, contains the CambridgeEntry extracted from its cambridge page
         self.phrasefinder_cache = {}
+        self.rendered_rows = {}  # lines currently shown in each indicator textedit
         self.look_up_scrubbed_timer = None  # timer to look up newly entered corrected versions of scrubbed terms on cambridge dictionary. timeout so as to not make the program freeze after every keystroke.
 
         # Set up font for textedits
@@ -208,14 +265,10 @@ class CorrectScrubbingOutput(QDialog):
             if s not in self.cambridge_available_cache:
 
                 log(f"looking up '{s}' on cambridge dictionary...", end="\t")
-                html = load_url('https://dictionary.cambridge.org/de/worterbuch/englisch/' + s, True).text
-
-                # check if there are any results for the word by looking for phrase contained in 'no results' page
-                if "Die beliebtesten Suchbegriffe" not in html:
-                    self.cambridge_available_cache[s] = html
+                self.cambridge_available_cache[s] = get_cambridge(s)
+                if self.cambridge_available_cache[s].found:
                     log("found", color="green", start="")
                 else:
-                    self.cambridge_available_cache[s] = False
                     log("not found", color="red", start="")
 
             if s not in self.phrasefinder_cache:
@@ -227,18 +280,50 @@ class CorrectScrubbingOutput(QDialog):
                 self.phrasefinder_cache[s] = i
                 log(f"{i} occurences", color="green", start="")
 
-        # rebuild the cambridge_available textedit content
-        self.cambridge_ipa.setText("<br>".join([self.get_ipa(s) if s in self.cambridge_available_cache and self.cambridge_available_cache[s] else "XX" for s in scrubbed]))
-
-        # rebuild the phrasefinder_rank textedit content
-        self.phrasefinder_rank.setText("\n".join([str(int(ceil(self.phrasefinder_cache[s] / 1000))).rjust(6) for s in scrubbed]))
+        # update the lines of the cambridge_available and phrasefinder_rank textedits that changed
+        self.update_rows(self.cambridge_ipa, [self.get_ipa(s) for s in scrubbed], 115, html=True)
+        self.update_rows(self.phrasefinder_rank, [str(int(ceil(self.phrasefinder_cache[s] / 1000))).rjust(6) for s in scrubbed])
 
         # scroll all textedits to the correct position again
         self.on_scroll(self.scrubbed.verticalScrollBar().value())
 
-        # set both 'indicator' textedits to the corrent line spacing
-        self.set_line_height(self.phrasefinder_rank)
-        self.set_line_height(self.cambridge_ipa, 115)
+    def update_rows(self, textedit: QTextEdit, rows: [str], height: int = 120, html: bool = False):
+        """Rewrite only the lines of the textedit that differ from what it currently shows, and set the line height on those lines only"""
+        rows = rows or [""]
+        old_rows = self.rendered_rows.get(textedit, [None])  # an empty document still has one (empty) line
+        document = textedit.document()
+
+        blockFmt = QTextBlockFormat()
+        blockFmt.setLineHeight(height, QTextBlockFormat.ProportionalHeight)
+
+        cursor = QTextCursor(document)
+        cursor.beginEditBlock()
+        for i, row in enumerate(rows):
+            if i < len(old_rows):
+                if old_rows[i] == row:
+                    continue
+                # select the content of the existing line
+                block = document.findBlockByNumber(i)
+                cursor.setPosition(block.position())
+                cursor.setPosition(block.position() + block.length() - 1, QTextCursor.KeepAnchor)
+            else:
+                cursor.movePosition(QTextCursor.End)
+                cursor.insertBlock()
+            if html:
+                cursor.insertHtml(row)
+            else:
+                cursor.insertText(row)
+            cursor.mergeBlockFormat(blockFmt)
+
+        # remove lines that aren't needed anymore
+        if len(rows) < len(old_rows):
+            block = document.findBlockByNumber(len(rows) - 1)
+            cursor.setPosition(block.position() + block.length() - 1)
+            cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+            cursor.removeSelectedText()
+        cursor.endEditBlock()
+
+        self.rendered_rows[textedit] = rows
 
     def set_line_height(self, textedit: QTextEdit, height: int = 120):
         """Set the line height of given QTextEdit by merging it with a QTextBlockFormat"""
@@ -252,12 +337,11 @@ class CorrectScrubbingOutput(QDialog):
         theCursor.mergeBlockFormat(blockFmt)
 
     def get_ipa(self, word: str):
-        html = self.cambridge_available_cache[word]
-        if any(html.find(x) == -1 for x in ["us dpron-i", 'type="audio/ogg" src="', '<span class="ipa dipa lpr-2 lpl-1">']):
-            return "XXX"
-        else:
-            american_part = html[html.find("us dpron-i"):]
-            return american_part[american_part.find('<span class="ipa dipa lpr-2 lpl-1">'):american_part.find("/</span></span>")]
+        """Return the american IPA of the term, 'XXX' if its Cambridge page has no pronunciation or 'XX' if there is no page"""
+        entry = self.cambridge_available_cache.get(word)
+        if not (entry and entry.found):
+            return "XX"
+        return entry.ipa or "XXX"
 
     def done_(self):
         """Extract original words and corrected scrubbed versions and return them to parent class to create Anki cards"""
@@ -1,4 +1,5 @@
 import datetime
+import threading
 from aqt.qt import QAction
 from aqt.utils import showInfo, tooltip
 
@@ -10,13 +11,15 @@ from aqt import gui_hooks
 from datetime import datetime
 from .utils import all_imported_words
 from anki.consts import *
+from anki.collection import AddNoteRequest
+from concurrent.futures import ThreadPoolExecutor
 
 
 
 class ImportEwFromCambridge:
     def __init__(self):
         # Initialize instances
-        self.cambridge_dict = None  # html of cambridge pages
+        self.cambridge_dict = None  # CambridgeEntry for every scrubbed term
         self.words = None  # words after user has corrected them
         self.scrubbing = None  # dict of unique words and user corrected scrubbed version
         self.done = all_imported_words()  # the ew that have previously been imported
@@ -39,7 +42,7 @@ class ImportEwFromCambridge:
         self.edit_dialog.exec()
 
     def scrubbing_edited(self, words, scrubbing, cambridge_dict):
-        """receive dict of unique words and their corrected scrubbed version and a dict containing the html of cambridge page for each scrubbed term
+        """receive dict of unique words and their corrected scrubbed version and a dict containing the CambridgeEntry for each scrubbed term
         :param words:
         """
         self.scrubbing = scrubbing
@@ -61,69 +64,91 @@ class ImportEwFromCambridge:
             else:
                 grouped_words[english] = [german]
 
+        # download frequency and audio of all words in the background, then add the notes on the main thread
+        mw.taskman.with_progress(lambda: self.prefetch(grouped_words), self.add_notes, label="Downloading audio and frequencies...")
 
-        for english, german in grouped_words.items():
-            log(f"Importing {english} - {german}")
+    def prefetch(self, grouped_words: {str: [str]}) -> [({str: str}, int)]:
+        """Prepare the fields of all notes in parallel. Returns (fields, prevalence) for every english word, in order"""
+        # Wait till theres an internet connection to continue
+        wait_for_internet_connection()
 
-            scrubbed = self.scrubbing[english]
+        with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as executor:
+            return list(executor.map(lambda x: self.prepare_fields(*x), grouped_words.items()))
 
-            prevalence = int(get_phrasefinder(scrubbed) / 1000)
-            fields = {"Englisch": english, "Bild": "", "Audio": "", "IPA": "", "Häufigkeit": str(prevalence).zfill(6), "Englisch scrubbed": scrubbed}
+    def prepare_fields(self, english: str, german: [str]) -> ({str: str}, int):
+        """Look up frequency and download audio of one word and return the note's fields and the word's prevalence"""
+        log(f"Importing {english} - {german}")
 
-            # Assign german words to their fields
-            for i, x in enumerate(german[:10]):
-                fields[f"Deutsch {str(i + 1)}"] = x
+        scrubbed = self.scrubbing[english]
 
-            # Wait till theres an internet connection to continue
-            wait_for_internet_connection()
+        prevalence = int(get_phrasefinder(scrubbed) / 1000)
+        fields = {"Englisch": english, "Bild": "", "Audio": "", "IPA": "", "Häufigkeit": str(prevalence).zfill(6), "Englisch scrubbed": scrubbed}
 
-            # Download audio from Cambridge
-            # check if there are any results for the word (if not, scrubbing[english] will be "False"
-            # todo: detect if there is ipa but no audio (results in absurd url now)
-            if html := self.cambridge_dict[scrubbed]:
-                # Extract american pronunciation and IPA
-                if any(html.find(x) == -1 for x in ["us dpron-i", 'type="audio/ogg" src="', '<span class="ipa dipa lpr-2 lpl-1">']):
-                    log("Does not have audio or IPA information!")
-                else:
-                    american_part = html[html.find("us dpron-i"):]
-                    audio_url = american_part[american_part.find('type="audio/ogg" src="') + len('type="audio/ogg" src="'):]
-                    audio_url = "https://dictionary.cambridge.org" + audio_url[:audio_url.find('"/>')]
-                    ipa = american_part[american_part.find('<span class="ipa dipa lpr-2 lpl-1">'):american_part.find("/</span></span>")]
-
-                    try:
-                        audio_path = os.path.join(MEDIA_FOLDER, f"cambridge-{scrubbed}.ogg")
-                        with open(audio_path, "wb") as file:
-                            file.write(load_url(audio_url, True).content)
-                            fields["Audio"] = f'[sound:cambridge-{scrubbed}.ogg]'
-
-                    except Exception as e:
-                        print(e)
-
-                    # Set field values
-                    fields["IPA"] = ipa
+        # Assign german words to their fields
+        for i, x in enumerate(german[:10]):
+            fields[f"Deutsch {str(i + 1)}"] = x
 
+        # Download audio from Cambridge
+        # check if there are any results for the word
+        if (entry := self.cambridge_dict[scrubbed]).found:
+            # Use american pronunciation and IPA
+            if not entry.ipa:
+                log("Does not have audio or IPA information!")
             else:
-                log(f"No Cambridge definition found for {scrubbed} ({english}).", color="red")
-
-            # Create the new notes
-            # Set the right deck (according to how common the word is) and model
-            selected_deck_id = mw.col.decks.id("All::Audio::Sprachen::🇺🇸 Englisch::_New" if prevalence >= 100 else "All::Audio::Sprachen::🇺🇸 Englisch::_New (rare)")
-            mw.col.decks.select(selected_deck_id)
-            model = mw.col.models.by_name(NOTE_TYPE_NAME)
-            deck = mw.col.decks.get(selected_deck_id)
-            deck['mid'] = model['id']
-            mw.col.decks.save(deck)
-            model['did'] = selected_deck_id
-            mw.col.models.save(model)
-
-            note = mw.col.newNote()
+                try:
+                    audio_path = os.path.join(MEDIA_FOLDER, f"cambridge-{scrubbed}.ogg")
+                    # words that scrub to the same term are downloaded by several workers at once, each writes its own file
+                    partial_path = f"{audio_path}.{threading.get_ident()}.part"
+                    with open(partial_path, "wb") as file:
+                        file.write(load_url(entry.audio_url, True).content)
+                    os.replace(partial_path, audio_path)
+                    fields["Audio"] = f'[sound:cambridge-{scrubbed}.ogg]'
+
+                except Exception as e:
+                    print(e)
+
+                # Set field values
+                fields["IPA"] = entry.ipa
+
+        else:
+            log(f"No Cambridge definition found for {scrubbed} ({english}).", color="red")
+
+        return fields, prevalence
+
+    def prepare_deck(self, deck_name: str, model) -> int:
+        """Select the deck and make it and the note type default to each other. Returns the deck id"""
+        selected_deck_id = mw.col.decks.id(deck_name)
+        mw.col.decks.select(selected_deck_id)
+        deck = mw.col.decks.get(selected_deck_id)
+        deck['mid'] = model['id']
+        mw.col.decks.save(deck)
+        model['did'] = selected_deck_id
+        mw.col.models.save(model)
+        return selected_deck_id
+
+    def add_notes(self, future):
+        """Create the new notes from the prefetched fields, all at once"""
+        prepared = future.result()
+
+        # Set the right deck (according to how common the word is) and model. Only once per deck
+        model = mw.col.models.by_name(NOTE_TYPE_NAME)
+        deck_ids = {}
+        add_requests = []
+        for fields, prevalence in prepared:
+            deck_name = "All::Audio::Sprachen::🇺🇸 Englisch::_New" if prevalence >= 100 else "All::Audio::Sprachen::🇺🇸 Englisch::_New (rare)"
+            if deck_name not in deck_ids:
+                deck_ids[deck_name] = self.prepare_deck(deck_name, model)
+
+            note = mw.col.new_note(model)
             for (name, value) in note.items():
                 if name in fields:
                     note[name] = fields[name]
-            mw.col.addNote(note)
-            for card in note.cards():
-                card.queue = anki.consts.QUEUE_TYPE_SUSPENDED
-                card.flush()
+            add_requests.append(AddNoteRequest(note=note, deck_id=deck_ids[deck_name]))
+
+        # add all notes in one transaction, then suspend all of their cards in one go
+        mw.col.add_notes(add_requests)
+        mw.col.sched.suspend_cards([card_id for request in add_requests for card_id in request.note.card_ids()])
+        mw.reset()
 
         tooltip("All words imported!")
         log("All words imported!", color="green")
@@ -0,0 +1,49 @@
+"""Normalize dict.cc terms so Cambridge and phrasefinder recognize them. Has no Anki dependencies so it can be benchmarked on its own"""
+
+import re
+from functools import lru_cache
+
+# Cut out these strings:
+CUT = ["sth.", "sb.", " from ", " into ", " with "]
+
+# Cut off anything after these strings:
+SPLIT = ["[", "{", "<", " for ", " to ", " of "]
+
+# cut off these strings if they occur at the very end
+END = [" to", " up", " into", " on", " upon", " off", " (off)", " about", " back"]
+
+# cut off these strings if they occur at the very beginning of the term
+START = ["to ", "make ", "a ", "be "]
+
+# Remove any other characters
+ALLOWED_CHARACTERS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZé '-"
+
+not_allowed_pattern = re.compile(f"[^{re.escape(ALLOWED_CHARACTERS)}]")
+
+
+@lru_cache(maxsize=65536)
+def scrub_word(word: str) -> str:
+    """Remove annotations and parts of the term that aren't essential. Otherwise Cambridge or phrasefinder might not recognize it"""
+    scrubbed = word.split("\t", 1)[0].strip()
+
+    for x in CUT:
+        scrubbed = scrubbed.replace(x, "")
+
+    # one split string after the other. Cutting at the first match of any would differ: cutting at " for " can turn " of " into a trailing " of"
+    for x in SPLIT:
+        scrubbed = scrubbed.split(x, 1)[0]
+
+    for x in END:
+        if scrubbed.endswith(x):
+            scrubbed = scrubbed[:-len(x)].strip()
+
+    for x in START:
+        if scrubbed.startswith(x):
+            scrubbed = scrubbed[len(x):].strip()
+
+    return not_allowed_pattern.sub("", scrubbed).strip()
+
+
+def scrub_words(words: [str]) -> [str]:
+    """Scrub a batch of terms. Every unique term is only scrubbed once, also across batches"""
+    return [scrub_word(word) for word in words]
@@ -6,11 +6,16 @@ import socket
 import os
 import urllib.parse
 import urllib.request
-from .constants import DONE_FOLDER
+from .constants import DONE_FOLDER, UNSUSPEND_BATCH_SIZE
+from .cache import lookup_cache
+from .scrubbing import scrub_word, scrub_words
+from .word_files import read_word_files
+from .cambridge import CambridgeEntry, parse_cambridge, CAMBRIDGE_URL
 from .lib import termcolor
 import datetime
 from aqt import mw
 import anki.consts
+from anki.utils import ids2str
 
 
 def log(text, start=None, end="\n", color="cyan", start_color="cyan"):
@@ -33,48 +38,47 @@ def load_url(url, silent=False):
         print("❌❌❌ Fehler in load_url!", e, url)
 
 
-def scrub_word(word):
-    """Remove annotations and parts of the term that aren't essential. Otherwise Cambridge or phrasefinder might not recognize it"""
-    scrubbed = word.split("\t")[0].strip()
-
-    # Cut out these strings:
-    cut = ["sth.", "sb.", " from ", " into ", " with "]
-    for x in cut:
-        scrubbed = scrubbed.replace(x, "")
-
-    # Cut off anything after these strings:
-    split = ["[", "{", "<", " for ", " to ", " of "]
-    for x in split:
-        scrubbed = scrubbed.split(x)[0]
-
-    # cut off these strings if they occur at the very end
-    end = [" to", " up", " into", " on", " upon", " off", " (off)", " about", " back"]
-    for x in end:
-        if scrubbed[-len(x):] == x:
-            scrubbed = scrubbed[:-len(x)].strip()
-
-    # cut off these strings if they occur at the very beginning of the term
-    start = ["to ", "make ", "a ", "be "]
-    for x in start:
-        if scrubbed[:len(x)] == x:
-            scrubbed = scrubbed[len(x):].strip()
-
-    # Remove any special characters
-    scrubbed = re.sub("[^abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZé '-]", '', scrubbed).strip()
-
-    return scrubbed
-
-
 def get_phrasefinder(en):
-    """Use the phrasefinder.io API to determine how common an english word is"""
+    """Use the phrasefinder.io API to determine how common an english word is. Results are kept in the persistent lookup cache"""
+    if (count := lookup_cache.get("phrasefinder", en)) is not None:
+        return count
+
     params = {'corpus': 'eng-us', 'query': urllib.parse.quote(en), 'topk': 20, 'format': 'tsv'}
     params = '&'.join('{}={}'.format(name, value) for name, value in params.items())
     try:
-        response = requests.get('https://api.phrasefinder.io/search?' + params)
-        return int(response.text.split("\t")[1])
+        response = requests.get('https://api.phrasefinder.io/search?' + params, timeout=120)
     except Exception as e:
-        # If the word can't be found, return 0
+        # no connection. Return 0 but don't cache it
+        return 0
+    if not response.ok:
+        # rate limited or server error. Return 0 but don't cache it
         return 0
+    try:
+        count = int(response.text.split("\t")[1])
+    except Exception as e:
+        # If the word can't be found, return 0
+        count = 0
+    lookup_cache.set("phrasefinder", en, count)
+    return count
+
+
+def get_cambridge(en) -> CambridgeEntry:
+    """Look up the term on Cambridge dictionary and return the extracted pronunciations. Results are kept in the persistent lookup cache"""
+    if (entry := lookup_cache.get("cambridge entry", en)) is not None:
+        return CambridgeEntry.from_dict(entry)
+
+    response = load_url(f'{CAMBRIDGE_URL}/de/worterbuch/englisch/' + en, True)
+    if response is None:
+        # no connection. Don't cache the failed lookup
+        return CambridgeEntry(found=False)
+    if not response.ok:
+        # rate limited or server error. Don't cache the error page
+        return CambridgeEntry(found=False)
+
+    # parse the page once, only the extracted record is kept
+    entry = parse_cambridge(response.text)
+    lookup_cache.set("cambridge entry", en, entry.to_dict())
+    return entry
 
 
 def has_internet_connection(host="8.8.8.8", port=53, timeout=3):
@@ -97,10 +101,7 @@ def wait_for_internet_connection():
 
 def all_imported_words():
     """Return all words that have already been imported into Anki"""
-    with os.scandir(DONE_FOLDER) as files:
-        files = [open(file.path, "r", encoding="utf-8").read().split("\n") for file in files]
-        words = [x.strip() for file in files for x in file if (x and not x[0] == "#")]
-        return list(set(words))
+    return read_word_files(DONE_FOLDER)
 
 
 def update_tampermonkey_list():
@@ -109,19 +110,39 @@ def update_tampermonkey_list():
         file.write("\n".join(all_imported_words()))
 
 
+def suspended_new_card_ids(deck: str, min_age_days: int) -> [int]:
+    """Return the ids of all suspended new cards in the deck that haven't been modified for at least min_age_days"""
+    card_ids = mw.col.find_cards(f'"deck:{deck}" is:suspended is:new')
+    if not card_ids:
+        return []
+    # filter by card modification time inside the collection instead of loading every card
+    cutoff = datetime.datetime.now().timestamp() - min_age_days * 86400
+    return mw.col.db.list(f"SELECT id FROM cards WHERE mod < ? AND id IN {ids2str(card_ids)}", cutoff)
+
+
 def unsuspend_new_cards():
     """unsuspend ew that have been imported 3 days ago or earlier and had been automatically suspended"""
     # reactivate common and rare words after different time intervals
-    normal_cards = [mw.col.get_card(card_id) for card_id in mw.col.find_cards('"deck:All::Audio::Sprachen::🇺🇸 Englisch::_New" is:suspended is:new')]
-    normal_cards = [card for card in normal_cards if datetime.datetime.now().timestamp() - card.mod > 3 * 86400]
-    rare_cards = [mw.col.get_card(card_id) for card_id in mw.col.find_cards('"deck:All::Audio::Sprachen::🇺🇸 Englisch::_New (rare)" is:suspended is:new')]
-    rare_cards = [card for card in rare_cards if datetime.datetime.now().timestamp() - card.mod > 6 * 86400]
+    normal_cards = suspended_new_card_ids("All::Audio::Sprachen::🇺🇸 Englisch::_New", 3)
+    rare_cards = suspended_new_card_ids("All::Audio::Sprachen::🇺🇸 Englisch::_New (rare)", 6)
 
     if not (normal_cards or rare_cards):
         return
 
     log(f"{len(normal_cards)} new common and {len(rare_cards)} new rare cards to unsuspend")
     log(f"Card ids: {normal_cards + rare_cards}")
-    for card in normal_cards + rare_cards:
-        card.queue = anki.consts.QUEUE_TYPE_NEW
-        card.flush()
+    card_ids = normal_cards + rare_cards
+
+    def unsuspend():
+        # unsuspend in batches off the main thread, reporting progress after each one
+        for start in range(0, len(card_ids), UNSUSPEND_BATCH_SIZE):
+            mw.col.sched.unsuspend_cards(card_ids[start:start + UNSUSPEND_BATCH_SIZE])
+            done = min(start + UNSUSPEND_BATCH_SIZE, len(card_ids))
+            mw.taskman.run_on_main(lambda done=done: mw.progress.update(label=f"Unsuspended {done}/{len(card_ids)} cards", value=done, max=len(card_ids)))
+
+    def on_done(future):
+        future.result()
+        log(f"Unsuspended {len(card_ids)} cards", color="green")
+        mw.reset()
+
+    mw.taskman.with_progress(unsuspend, on_done, label="Unsuspending new cards...")
@@ -0,0 +1,10 @@
+"""Read the folders of imported words. Has no Anki dependencies so it can be benchmarked on its own"""
+
+import os
+
+
+def read_word_files(folder: str) -> [str]:
+    """Return the unique words of all text files in the folder, one word per line. Lines starting with # are ignored"""
+    with os.scandir(folder) as files:
+        files = [open(file.path, "r", encoding="utf-8").read().split("\n") for file in files]
+        return list(set([x.strip() for file in files for x in file if (x and not x[0] == "#")]))
@@ -0,0 +1,59 @@
+import hashlib
+import io
+import os
+import shutil
+import requests
+from .constants import REQUEST_TIMEOUT
+
+try:
+    from PIL import Image
+except ImportError:
+    # recompressing is optional
+    Image = None
+
+
+def download_file(url: str) -> bytes:
+    """Download a small file (e.g. a thumbnail) into memory"""
+    response = requests.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response.content
+
+
+def recompress_image(data: bytes, max_bytes: int) -> bytes:
+    """Re-encode the image as JPEG with decreasing quality, then decreasing size, until it fits into max_bytes. Returns it unchanged if it already fits or Pillow isn't installed"""
+    if Image is None or len(data) <= max_bytes:
+        return data
+    image = Image.open(io.BytesIO(data)).convert("RGB")
+    while True:
+        for quality in [85, 75, 65, 55]:
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=quality, optimize=True)
+            if output.tell() <= max_bytes:
+                return output.getvalue()
+        if image.width < 160:
+            return output.getvalue()
+        image = image.resize((image.width * 3 // 4, image.height * 3 // 4))
+
+
+class AttachmentStore:
+    """Stores every attachment once, named by its content hash, and hard links it to wherever it is needed. Identical files take up space only once"""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+
+    def add(self, data: bytes, extension: str, target_path: str) -> str:
+        """Store the data (if it isn't yet) and link it to target_path. Returns target_path"""
+        os.makedirs(self.folder, exist_ok=True)
+        store_path = os.path.join(self.folder, f"{hashlib.sha256(data).hexdigest()}.{extension}")
+        if not os.path.isfile(store_path):
+            with open(store_path + ".part", "wb") as file:
+                file.write(data)
+            os.replace(store_path + ".part", store_path)
+
+        if not os.path.exists(target_path):
+            try:
+                os.link(store_path, target_path)
+            except OSError:
+                # the filesystem doesn't support hard links
+                shutil.copyfile(store_path, target_path)
+        return target_path
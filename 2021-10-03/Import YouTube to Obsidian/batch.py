@@ -0,0 +1,106 @@
+import argparse
+import pytube
+from pytube.exceptions import RegexMatchError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pytube.extract import video_id as extract_video_id
+from .import_youtube_video_into_obsidian import YoutubeDownloader
+from .constants import CAPTURE_PROFILES
+from .remux import OUTPUT_PROFILES
+from .video_index import video_index
+
+
+def expand_source(source: str) -> [str]:
+    """Return the video urls of a playlist or channel url, or the url itself if it's a single video"""
+    if "list=" in source:
+        return list(pytube.Playlist(source).video_urls)
+    if any(x in source for x in ["/channel/", "/c/", "/user/", "/@"]):
+        return list(pytube.Channel(source).video_urls)
+    return [source]
+
+
+def read_queue_file(path: str) -> [str]:
+    """Return the urls in a queue file, one per line. Empty lines and lines starting with # are ignored"""
+    with open(path, "r", encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip() and not line.strip().startswith("#")]
+
+
+class BatchImporter:
+    """Import many videos at once. Network-bound stages of several videos run in parallel, while remuxing and writing notes happen in a separate, smaller pool"""
+
+    def __init__(self, downloader: YoutubeDownloader = None, network_workers: int = 4, disk_workers: int = 1):
+        self.downloader = downloader or YoutubeDownloader()
+        self.network_workers = network_workers
+        self.disk_workers = disk_workers
+
+    def run(self, sources: [str]):
+        """Import all videos of the given video, playlist or channel urls"""
+        # remove duplicates, keep order
+        urls = list(dict.fromkeys(url for source in sources for url in expand_source(source)))
+
+        # a malformed line in the queue file shouldn't stop the whole batch
+        video_ids = {}
+        for url in urls:
+            try:
+                video_ids[url] = extract_video_id(url)
+            except RegexMatchError:
+                print("Not a video url, skipping:", url)
+        urls = list(video_ids)
+
+        # skip videos that have already been imported without asking YouTube about them
+        imported = [url for url in urls if video_index.is_imported(video_ids[url])]
+        urls = [url for url in urls if url not in imported]
+        print(f"Importing {len(urls)} videos, {len(imported)} already imported")
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.network_workers) as network_pool, ThreadPoolExecutor(max_workers=self.disk_workers) as disk_pool:
+            fetches = {network_pool.submit(self.downloader.fetch, url): url for url in urls}
+            finishes = {}
+            for future in as_completed(fetches):
+                try:
+                    if job := future.result():
+                        finishes[disk_pool.submit(self.downloader.finish, job)] = (fetches[future], job)
+                except Exception as e:
+                    print("Error downloading", fetches[future], e)
+                    failed.append(fetches[future])
+
+            for future in as_completed(finishes):
+                url, job = finishes[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print("Error finishing", url, e)
+                    # like get(): keep the progress, but not the half written output
+                    self.downloader.remove_partial_files(job)
+                    failed.append(url)
+
+        print(f"Done. {len(urls) - len(failed)} of {len(urls)} videos imported")
+        if failed:
+            print("Failed (run again to resume):", *failed, sep="\n")
+        return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import YouTube videos, playlists or channels into Obsidian")
+    parser.add_argument("urls", nargs="*", help="video, playlist or channel urls")
+    parser.add_argument("-q", "--queue-file", help="file with one url per line")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="videos downloaded at the same time")
+    parser.add_argument("--disk-workers", type=int, default=1, help="videos remuxed at the same time")
+    parser.add_argument("-p", "--profile", choices=CAPTURE_PROFILES, default="video", help="what to download of every video")
+    parser.add_argument("-o", "--output-profile", choices=list(OUTPUT_PROFILES), default="copy", help="copy the streams or transcode them to a more compact codec")
+    parser.add_argument("--threads", type=int, help="threads ffmpeg may use for transcoding")
+    parser.add_argument("--nice", type=int, help="niceness of ffmpeg while transcoding")
+    args = parser.parse_args()
+
+    sources = args.urls + (read_queue_file(args.queue_file) if args.queue_file else [])
+    if not sources:
+        parser.error("no urls given")
+    downloader = YoutubeDownloader(profile=args.profile, output_profile=args.output_profile)
+    if args.threads:
+        downloader.transcode_threads = args.threads
+    if args.nice is not None:
+        downloader.transcode_niceness = args.nice
+    BatchImporter(downloader, network_workers=args.workers, disk_workers=args.disk_workers).run(sources)
+
+
+if __name__ == "__main__":
+    main()
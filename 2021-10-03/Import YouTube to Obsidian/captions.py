@@ -1,80 +1,109 @@
 from youtube_transcript_api import YouTubeTranscriptApi
-from youtube_transcript_api.formatters import Formatter, WebVTTFormatter
+from youtube_transcript_api.formatters import Formatter, WebVTTFormatter, TextFormatter
 from youtube_transcript_api._errors import NoTranscriptFound, TranscriptsDisabled
 
 from math import floor
+from itertools import groupby
+import json
+import os
+from .constants import TRANSCRIPT_FOLDER
 
 
 class Obsidian30SecondSnippetsFormatter(Formatter):
     """Will format a transcript as a markdown file with headers for every 30 seconds block of text"""
 
-    def format_transcript(self, transcript, **kwargs):
-        """Format a single transcript"""
-        blocks = []
-
-        for sentence in transcript:
-            # combine the sentences into 30 seconds blocks
-            current_minute = floor(sentence["start"] / 30) + 1
-            if current_minute > len(blocks):
-                blocks.append("")
-            blocks[-1] += " " + sentence["text"]
+    def __init__(self, block_seconds: int = 30):
+        self.block_seconds = block_seconds
 
-        blocks = [text.strip() for text in blocks]
-
-        _return = ""
-        for count, text in enumerate(blocks):
+    def blocks(self, transcript, block_seconds: int = None):
+        """Yield the formatted blocks one by one. Expects the sentences in chronological order, as YouTube returns them.
+        Only the sentences of the current block are held in memory, blocks without any text are left out"""
+        block_seconds = block_seconds or self.block_seconds
+        for index, sentences in groupby(transcript, key=lambda sentence: floor(sentence["start"] / block_seconds)):
             # create header showing time position in format HH:MM:SS
-            hours, total_seconds = divmod(count * 30, 3600)
+            hours, total_seconds = divmod(index * block_seconds, 3600)
             mins, sec = divmod(total_seconds, 60)
-            header = f"# {str(hours).zfill(2)}:{str(mins).zfill(2)}:{str(sec).zfill(2)}"
+            text = " ".join(sentence["text"] for sentence in sentences).strip()
+            yield f"# {str(hours).zfill(2)}:{str(mins).zfill(2)}:{str(sec).zfill(2)}\n\n{text}\n\n"
+
+    def format_transcript(self, transcript, block_seconds: int = None, **kwargs):
+        """Format a single transcript"""
+        return "".join(self.blocks(transcript, block_seconds))
 
-            _return += f"{header}\n\n{text}\n\n"
-        return _return
+    def write_transcript(self, transcript, file, block_seconds: int = None):
+        """Format a single transcript and write it block by block to the open file"""
+        for block in self.blocks(transcript, block_seconds):
+            file.write(block)
 
     def format_transcripts(self, transcripts, **kwargs):
         """Format several transcripts. Required to have this method"""
         return '\n\n\n'.join([self.format_transcript(transcript, **kwargs) for transcript in transcripts])
 
 
-obsidian_formatter = Obsidian30SecondSnippetsFormatter()
-webvtt_formatter = WebVTTFormatter()
+formatters = {"obsidian": Obsidian30SecondSnippetsFormatter(), "webvtt": WebVTTFormatter(), "text": TextFormatter()}
+
+
+def cached_transcript_path(video_id: str, language: str) -> str:
+    return os.path.join(TRANSCRIPT_FOLDER, f"{video_id}.{language}.json")
+
 
+def find_cached_transcript(video_id: str, languages: [str] = ("en", "de")) -> str:
+    """Return the absolute path of the cached segments of the video in the first available language, or None"""
+    for language in languages:
+        if os.path.isfile(path := cached_transcript_path(video_id, language)):
+            return os.path.abspath(path)
+    return None
+
+
+def load_transcript(path: str) -> [dict]:
+    """Load cached transcript segments"""
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def fetch_transcript(video_id: str, languages: [str] = ("en", "de")) -> [dict]:
+    """Return the raw segments of the best transcript for the video (selects manually over automatically created), or None if there is none.
+    Lists and fetches the transcripts at most once, and caches the segments on disk"""
+    if path := find_cached_transcript(video_id, languages):
+        return load_transcript(path)
 
-def download_transcript(video_id: str, filename: str, format: str, return_raw=False):
-    """Will find the best transcript for the video (selects manually over automatically created) and format it in the specified format
-    :param return_raw: whether to return the formatted transcript as text or save it to file
-    Todo: specify preferred language or get several"""
-    transcript = None
     try:
-        transcript = YouTubeTranscriptApi.list_transcripts(video_id).find_manually_created_transcript(["en", "de"]).fetch()
-        print("Found manually created transcript")
-        return transcript
-    except NoTranscriptFound:
-        pass
+        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
     except TranscriptsDisabled:
         print("Transcripts disabled for this video")
-        return
+        return None
 
     try:
-        transcript = YouTubeTranscriptApi.list_transcripts(video_id).find_generated_transcript(["en", "de"]).fetch()
-        print("Found automatically generated transcript")
-        return transcript
+        transcript = transcript_list.find_manually_created_transcript(languages)
+        print("Found manually created transcript")
     except NoTranscriptFound:
-        pass
-    print("No transcripts found")
-
-    if not transcript:
-        return False
-
-    # format the transcript
-    if format == "obsidian":
-        formatted = obsidian_formatter.format_transcript(transcript)
-    else:
-        formatted = webvtt_formatter.format_transcript(transcript)
-    if return_raw:
-        return formatted
-
-    # save the transcript to file
-    with open(filename, 'w', encoding='utf-8') as file:
-        file.write(formatted)
-    return True
+        try:
+            transcript = transcript_list.find_generated_transcript(languages)
+            print("Found automatically generated transcript")
+        except NoTranscriptFound:
+            print("No transcripts found")
+            return None
+
+    segments = transcript.fetch()
+    os.makedirs(TRANSCRIPT_FOLDER, exist_ok=True)
+    with open(cached_transcript_path(video_id, transcript.language_code), "w", encoding="utf-8") as file:
+        json.dump(segments, file)
+    return segments
+
+
+def download_transcript(video_id: str, filenames: {str: str}) -> {str: str}:
+    """Fetch the transcript once and format it in every requested format ('obsidian', 'webvtt' or 'text')
+    :param filenames: maps each format to the file it is saved to, or None to only return it
+    :return: the formatted transcript for every format, empty if there is no transcript
+    Todo: get several languages"""
+    segments = fetch_transcript(video_id)
+    if not segments:
+        return {}
+
+    formatted = {}
+    for format, filename in filenames.items():
+        formatted[format] = formatters[format].format_transcript(segments)
+        if filename:
+            with open(filename, 'w', encoding='utf-8') as file:
+                file.write(formatted[format])
+    return formatted
@@ -0,0 +1,37 @@
+import requests
+from .constants import COMMENTS_API_URL, COMMENTS_PAGE_SIZE, REQUEST_TIMEOUT
+
+
+class CommentsDisabled(Exception):
+    pass
+
+
+def comment_pages(video_id: str, api_key: str, page_token: str = None):
+    """Yield (comment threads, token of the next page) page by page, starting at page_token. Only one page is held in memory"""
+    while True:
+        params = {"part": "snippet,replies", "videoId": video_id, "key": api_key, "maxResults": COMMENTS_PAGE_SIZE, "order": "relevance", "textFormat": "plainText"}
+        if page_token:
+            params["pageToken"] = page_token
+        response = requests.get(COMMENTS_API_URL, params=params, timeout=REQUEST_TIMEOUT)
+        if response.status_code == 403 and "commentsDisabled" in response.text:
+            raise CommentsDisabled()
+        response.raise_for_status()
+        page = response.json()
+        page_token = page.get("nextPageToken")
+        yield page.get("items", []), page_token
+        if not page_token:
+            return
+
+
+def format_comment(snippet: dict) -> str:
+    """One comment as markdown: author, date and likes, then the text"""
+    likes = f" · 👍 {snippet['likeCount']}" if snippet.get("likeCount") else ""
+    return f"**{snippet['authorDisplayName']}** · {snippet['publishedAt'][:10]}{likes}\n{snippet['textDisplay'].strip()}"
+
+
+def format_thread(thread: dict) -> str:
+    """A top level comment followed by its replies as quotes. The API only includes the first few replies"""
+    text = format_comment(thread["snippet"]["topLevelComment"]["snippet"])
+    for reply in reversed(thread.get("replies", {}).get("comments", [])):
+        text += "\n\n> " + format_comment(reply["snippet"]).replace("\n", "\n> ")
+    return text + "\n\n---\n\n"
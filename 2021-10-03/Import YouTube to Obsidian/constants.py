@@ -1,7 +1,9 @@
+import os
+
 obsidian_template = """\
 # Video Name: %title
 
-![[%video_file]]
+%media
 
 #### [Link auf Youtube](%youtube_link)
 #### [[%comments]]
@@ -30,4 +32,46 @@ Views: %view_count
 """
 
 
-resolution_levels = [2160, 1440, 1080, 720, 480, 360, 240, 144]
\ No newline at end of file
+resolution_levels = [2160, 1440, 1080, 720, 480, 360, 240, 144]
+
+# downloading streams
+DOWNLOAD_CHUNK_SIZE = 9437184  # bytes per ranged request (YouTube throttles larger ones)
+REQUEST_TIMEOUT = 30  # seconds
+DOWNLOAD_RETRIES = 5  # failed downloads are resumed this many times
+STREAM_CACHE_MAX_BYTES = 20 * 1024 ** 3  # finished streams are kept until the cache grows beyond this
+
+# capture profiles: what is downloaded of a video
+# video: best video and audio stream, remuxed into one file
+# capped: like video, but within CAPPED_MAX_BITRATE
+# audio: only the best audio stream, no video and no remuxing
+# transcript: no media at all, the note embeds the thumbnail instead
+CAPTURE_PROFILES = ["video", "capped", "audio", "transcript"]
+CAPPED_MAX_BITRATE = 2000000  # bits per second for video and audio stream together
+AUDIO_FILE_EXTENSION = {"mp4": "m4a", "webm": "webm"}  # file extension of an audio-only stream by its container
+
+# comments, fetched with the YouTube Data API (needs an API key)
+YOUTUBE_API_KEY = os.environ.get("YOUTUBE_API_KEY")
+COMMENTS_API_URL = "https://www.googleapis.com/youtube/v3/commentThreads"
+COMMENTS_PAGE_SIZE = 100  # comment threads per request, at most 100
+MAX_COMMENTS = 1000  # comment threads saved per video, None for all of them
+
+# transcoding (output profiles other than copy)
+TRANSCODE_THREADS = max(1, (os.cpu_count() or 2) // 2)  # threads ffmpeg may use, leaves the other half of the cores free
+TRANSCODE_NICENESS = 10  # lower priority than everything else on the desktop
+
+# thumbnails
+THUMBNAIL_MAX_BYTES = 200 * 1024  # larger thumbnails are recompressed (if Pillow is installed), None to keep them as they are
+ATTACHMENT_STORE_FOLDER = ".by content"  # inside the attachments folder, every thumbnail once, named by its hash
+
+# working folders
+CACHE_FOLDER = ".cache"  # caption tracks, one folder per video
+STREAM_CACHE_FOLDER = ".streams"  # downloaded streams, unfinished ones as .part files
+PROGRESS_FOLDER = ".progress"  # finished stages of every unfinished import
+TRANSCRIPT_FOLDER = ".transcripts"  # raw transcript segments, one file per video and language
+INDEX_FILE = "video index.sqlite"  # metadata of all imported videos
+METADATA_CACHE_FILE = "metadata cache.sqlite"  # channel names and video metadata looked up on YouTube
+SEARCH_INDEX_FILE = "transcript search.sqlite"  # full-text index of all transcript segments
+
+# how long looked up information stays valid, in seconds
+CHANNEL_NAME_TTL = 30 * 86400
+VIDEO_METADATA_TTL = 86400
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from .constants import DOWNLOAD_CHUNK_SIZE, REQUEST_TIMEOUT, STREAM_CACHE_FOLDER, STREAM_CACHE_MAX_BYTES, DOWNLOAD_RETRIES
+
+
+class StreamCache:
+    """Folder of downloaded streams. Unfinished downloads are kept as .part files and resumed on the next try.
+    Finished ones are verified by size and checksum and evicted least recently used first (by access time) once the folder grows beyond max_bytes.
+    Streams of imports that are still running are held and never evicted"""
+
+    def __init__(self, folder: str = STREAM_CACHE_FOLDER, max_bytes: int = STREAM_CACHE_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.held = set()  # file names of the streams in use
+
+    def hold(self, paths: [str]):
+        """Keep the streams from being evicted until they are released. Waits for an eviction that is running, so the files can be checked afterwards"""
+        with self.lock:
+            self.held.update(os.path.basename(path) for path in paths)
+
+    def release(self, paths: [str]):
+        with self.lock:
+            self.held.difference_update(os.path.basename(path) for path in paths)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder, name)
+
+    def get(self, name: str) -> str:
+        """Return the path of the finished and verified stream, or None"""
+        path = self.path(name)
+        if not (os.path.isfile(path) and os.path.isfile(path + ".json")):
+            return None
+        with open(path + ".json", "r", encoding="utf-8") as file:
+            info = json.load(file)
+        stat = os.stat(path)
+        # only hash the file again if it was changed since it was verified
+        if stat.st_size != info["size"] or (stat.st_mtime != info.get("mtime") and file_checksum(path) != info["sha256"]):
+            print("Cached stream is corrupt, downloading it again:", name)
+            os.remove(path)
+            os.remove(path + ".json")
+            return None
+        if stat.st_mtime != info.get("mtime"):
+            self.write_info(path, info["size"], info["sha256"])
+        # mark as recently used, keeping the modification time the record refers to
+        os.utime(path, (time.time(), stat.st_mtime))
+        return path
+
+    @staticmethod
+    def write_info(path: str, size: int, checksum: str):
+        with open(path + ".json", "w", encoding="utf-8") as file:
+            json.dump({"size": size, "sha256": checksum, "mtime": os.stat(path).st_mtime}, file)
+
+    def download(self, stream, name: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE, retries: int = DOWNLOAD_RETRIES) -> str:
+        """Return the path of the stream, downloading it with ranged requests of chunk_size bytes unless it is cached.
+        Failed attempts are resumed where they stopped, up to %retries times. The stream is held until it's released"""
+        self.hold([name])
+        if path := self.get(name):
+            print("Using cached stream", name)
+            return path
+
+        os.makedirs(self.folder, exist_ok=True)
+        path = self.path(name)
+        partial_path = path + ".part"
+        filesize = stream.filesize
+        if os.path.isfile(partial_path) and os.path.getsize(partial_path) > filesize:
+            # left over from a different stream, can't be resumed
+            os.remove(partial_path)
+        for attempt in range(retries + 1):
+            try:
+                checksum = self.download_range(stream.url, partial_path, filesize, chunk_size)
+                break
+            except (requests.RequestException, IOError) as e:
+                if attempt == retries:
+                    raise
+                print(f"Download of {name} failed ({e}), resuming at {os.path.getsize(partial_path) if os.path.isfile(partial_path) else 0} bytes")
+                time.sleep(2 ** attempt)
+
+        if (size := os.path.getsize(partial_path)) != filesize:
+            # start over on the next try
+            os.remove(partial_path)
+            raise IOError(f"Downloaded {size} bytes of {name}, expected {filesize}")
+        os.replace(partial_path, path)
+        self.write_info(path, filesize, checksum)
+
+        self.evict()
+        return path
+
+    @staticmethod
+    def download_range(url: str, partial_path: str, filesize: int, chunk_size: int) -> str:
+        """Download the bytes that are still missing from partial_path. Returns the sha256 checksum of the whole file"""
+        checksum = hashlib.sha256()
+        downloaded = 0
+        if os.path.isfile(partial_path):
+            # continue the checksum over what's already there
+            with open(partial_path, "rb") as file:
+                while data := file.read(1048576):
+                    checksum.update(data)
+                    downloaded += len(data)
+
+        with open(partial_path, "ab") as file:
+            while downloaded < filesize:
+                last_byte = min(downloaded + chunk_size, filesize) - 1
+                response = requests.get(url, headers={"Range": f"bytes={downloaded}-{last_byte}"}, stream=True, timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+                if response.status_code != 206:
+                    raise IOError(f"Server ignored the range request (status {response.status_code})")
+                requested_from = downloaded
+                for data in response.iter_content(chunk_size=65536):
+                    file.write(data)
+                    checksum.update(data)
+                    downloaded += len(data)
+                if downloaded == requested_from:
+                    # would ask for the same range forever
+                    raise IOError(f"Empty response for bytes {requested_from}-{last_byte}")
+        return checksum.hexdigest()
+
+    def evict(self):
+        """Delete the least recently used finished streams until the cache fits into max_bytes. Unfinished downloads and held streams are left alone"""
+        with self.lock:
+            streams = []
+            for entry in os.scandir(self.folder):
+                if entry.name.endswith((".part", ".json")) or entry.name in self.held:
+                    continue
+                stat = entry.stat()
+                streams.append((stat.st_atime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in streams)
+            for _, size, path in sorted(streams):
+                if total <= self.max_bytes:
+                    break
+                os.remove(path)
+                if os.path.isfile(path + ".json"):
+                    os.remove(path + ".json")
+                total -= size
+
+
+def file_checksum(path: str) -> str:
+    """Return the sha256 checksum of a file"""
+    checksum = hashlib.sha256()
+    with open(path, "rb") as file:
+        while data := file.read(1048576):
+            checksum.update(data)
+    return checksum.hexdigest()
+
+
+stream_cache = StreamCache()
+
+
+def download_stream(stream, name: str) -> str:
+    """Download a pytube stream into the stream cache under the given name. Returns the file path"""
+    return stream_cache.download(stream, name)
+
+
+def download_streams(*downloads: (any, str)) -> [str]:
+    """Download several (stream, name) pairs at the same time. Returns the file paths in the same order"""
+    with ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+        futures = [executor.submit(download_stream, stream, name) for stream, name in downloads]
+        return [future.result() for future in futures]
@@ -1,168 +1,384 @@
-"""
-TODO: create json file with all information, then seperate class that converts json to md. that way, files can be updated / recreated in a new format later, and analyzed (machine-readable)
-"""
-
 from os.path import join as joinpath
 from datetime import datetime as datetime2
 import sys
 import requests
 import os
-import ffmpeg
 import pytube
+from pytube.extract import video_id as extract_video_id
 from math import ceil
 from .constants import *
 import shutil
-from .captions import download_transcript
+import sqlite3
+import json
+import traceback
+from dataclasses import dataclass, field, fields
+from .captions import download_transcript, find_cached_transcript, load_transcript
+from .video_index import video_index
+from .transcript_search import transcript_search_index
+from .metadata_cache import metadata_cache
+from .notes import write_note
 from .utils import string_to_filename
+from .downloads import download_streams, stream_cache
+from .streams import select_streams, select_audio_stream
+from .comments import comment_pages, format_thread, CommentsDisabled
+from .remux import OUTPUT_PROFILES, remux
+from .attachments import AttachmentStore, download_file, recompress_image
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+
+SKIPPED = "skipped"  # returned by optional stages that failed
+
+
+@dataclass
+class VideoJob:
+    """State of importing one video. Saved after every finished stage so an interrupted import resumes where it stopped"""
+    url: str
+    video_id: str
+    metadata: dict = field(default_factory=dict)  # title, channel, dates etc. as plain values
+    filenames: dict = field(default_factory=dict)
+    filepath: dict = field(default_factory=dict)
+    files: dict = field(default_factory=dict)  # downloaded streams
+    finished_stages: [str] = field(default_factory=list)
+    video: pytube.YouTube = None  # not saved, recreated when needed
+
+    @property
+    def progress_file(self):
+        return joinpath(PROGRESS_FOLDER, f"{self.video_id}.json")
 
-# URL of the video to be downloaded
+    @property
+    def temp_folder(self):
+        return joinpath(CACHE_FOLDER, self.video_id)
 
-url = "https://www.youtube.com/watch?v=xxxxxxxx"
+    def save(self):
+        os.makedirs(PROGRESS_FOLDER, exist_ok=True)
+        with open(self.progress_file, "w", encoding="utf-8") as file:
+            # not asdict(): that would deep copy the pytube object too
+            json.dump({f.name: getattr(self, f.name) for f in fields(self) if f.name != "video"}, file)
 
+    @classmethod
+    def load(cls, url: str):
+        """Load the saved progress of the video or start a new job"""
+        video_id = extract_video_id(url)
+        progress_file = joinpath(PROGRESS_FOLDER, f"{video_id}.json")
+        if os.path.isfile(progress_file):
+            with open(progress_file, "r", encoding="utf-8") as file:
+                return cls(**json.load(file))
+        return cls(url=url, video_id=video_id)
 
-def select_streams(video):
-    """Return the video stream that best matches mime type and resolution preferences with matching audio stream"""
-    # Select preferred maximum resolution based on video length (2160, 1440, 1080, 720, 480, 360, 240, 144)
-    target_resolution_depth = 1 if 400 > video.length else 2 if 1000 > video.length else 3
+    def finish_stage(self, stage: str):
+        self.finished_stages.append(stage)
+        self.save()
 
-    # find streams in best resolution and format
-    print(video.streams)
-    streams_by_mime_type = [[x for x in video.streams.filter(mime_type="video/webm", progressive=False)],
-                            [x for x in video.streams.filter(mime_type="video/mp4") if x.video_codec[:3] == "avc" and x.is_progressive == False]]
-    stream = None
-    while not stream:
-        target_resolution = resolution_levels[target_resolution_depth]
-        resolution = f"{target_resolution}p"
-        print(f"Searching for streams in {resolution}")
-        for streams in streams_by_mime_type:
-            streams = [s for s in streams if s.resolution == resolution]
-            if streams:
-                print("Best stream: ", streams[0])
-                stream = streams[0]
-                audio_mime_type = stream.mime_type.replace("video", "audio")
-                video_file_extension = stream.mime_type.replace("video/", "")
-                break
+    def get_video(self) -> pytube.YouTube:
+        if self.video is None:
+            self.video = pytube.YouTube(self.url)
+        return self.video
 
-        target_resolution_depth += 1
-    audio_stream = video.streams.filter(mime_type=audio_mime_type).order_by("bitrate").desc()[0]
-    print("Audio stream: ", audio_stream)
-    return stream, audio_stream, video_file_extension
+    def log(self, *text):
+        print(f"[{self.video_id}]", *text)
 
 
 class YoutubeDownloader:
-    def __init__(self):
+    """Imports videos in stages. The network-bound stages (fetch) and the disk-bound ones (finish) can run in different worker pools"""
+
+    network_stages = [["metadata"], ["captions", "streams", "thumbnail", "comments"]]  # the stages of each group run at the same time
+    disk_stages = ["remux", "note"]
+
+    def __init__(self, profile: str = "video", output_profile: str = "copy"):
+        """:param profile: what to download of every video, one of CAPTURE_PROFILES
+        :param output_profile: how the streams are combined into the video file, one of OUTPUT_PROFILES"""
+        if profile not in CAPTURE_PROFILES:
+            raise ValueError(f"Unknown capture profile {profile}, choose one of {CAPTURE_PROFILES}")
+        if output_profile not in OUTPUT_PROFILES:
+            raise ValueError(f"Unknown output profile {output_profile}, choose one of {list(OUTPUT_PROFILES)}")
+        self.profile = profile
+        self.output_profile = output_profile
+        self.transcode_threads = TRANSCODE_THREADS
+        self.transcode_niceness = TRANSCODE_NICENESS
         self.target_folder_for_md = r"/hdd/Obsidian/Main/"
         self.target_folder_for_attachments = r"/hdd/Obsidian/Main/ο Anhänge"
         self.obsidian_template = obsidian_template
-        self.output_attachments_folder = ".temp/output/"
-        self.temp_folder = None
+        self.max_bitrate = None  # optional budget for video and audio stream together, in bits per second
+        self.thumbnail_max_bytes = THUMBNAIL_MAX_BYTES
+        self.youtube_api_key = YOUTUBE_API_KEY
+        self.max_comments = MAX_COMMENTS
+        self.attachment_store = AttachmentStore(joinpath(self.target_folder_for_attachments, ATTACHMENT_STORE_FOLDER))
+        self.progress_lock = threading.Lock()
 
     def get(self, video_link):
-        """try downloading the video. if it doesn't finish, clean up the temp folder"""
+        """Import one video. If it doesn't finish, delete unfinished output files but keep the progress to resume later"""
+        job = None
         try:
-            self._get(video_link)
-        except:
-            self.clean_up_temp()
-
-    def _get(self, video_link):
-        # Initialize video information
-        video = pytube.YouTube(video_link)
-        print(video.title)
-        channel_name = pytube.Channel(video.channel_url).channel_name
-        publish_date = video.publish_date.strftime("%Y-%m-%d")
-        self.target_folder_for_attachments = joinpath(r"/hdd/Obsidian/Main/ο Anhänge/", publish_date)
-
-        # check if video was already downloaded
-        if os.path.exists(joinpath(self.target_folder_for_md, f'🎞 {string_to_filename(f"{video.title} ({channel_name})")} (YouTube).md')):
-            print("video already downloaded, skipping")
-            return
+            job = self.fetch(video_link)
+            if job:
+                self.finish(job)
+        except Exception as e:
+            print("Error importing", video_link, e)
+            print(traceback.format_exc())
+            if job:
+                self.remove_partial_files(job)
+
+    def fetch(self, video_link) -> VideoJob:
+        """Run all network-bound stages that haven't been finished yet. Returns None if the video has already been imported"""
+        job = VideoJob.load(video_link)
+        if video_index.is_imported(job.video_id):
+            job.log("video already downloaded, skipping")
+            return None
+        for group in self.network_stages:
+            stages = [stage for stage in group if stage not in job.finished_stages]
+            if not stages:
+                continue
+            with ThreadPoolExecutor(max_workers=len(stages)) as executor:
+                futures = [executor.submit(self.run_stage, job, stage) for stage in stages]
+                results = [future.result() for future in futures]
+            if False in results:
+                return None
+        return job
 
-        video_stream, audio_stream, video_file_extension = select_streams(video)
+    def run_stage(self, job: VideoJob, stage: str):
+        """Run a single stage and save that it's finished. Returns False if the import should stop.
+        Optional stages return SKIPPED when they failed: the import goes on, and the stage is tried again if the import is resumed"""
+        # stages of the same group run at the same time: they only change the job while holding progress_lock
+        if (result := getattr(self, f"stage_{stage}")(job)) not in (False, SKIPPED):
+            with self.progress_lock:
+                job.finish_stage(stage)
+        return result
 
-        # Initialize folders
-        self.temp_folder = joinpath(".cache", video.video_id)
-        self.temp_folder_audio = self.temp_folder + "/audio/"
+    def finish(self, job: VideoJob):
+        """Run all disk-bound stages that haven't been finished yet, then clean up"""
+        for stage in self.disk_stages:
+            if stage not in job.finished_stages:
+                self.run_stage(job, stage)
+        self.clean_up(job)
 
-        os.makedirs(self.temp_folder, exist_ok=True)
-        os.makedirs(self.temp_folder_audio, exist_ok=True)
-        os.makedirs(self.target_folder_for_attachments, exist_ok=True)
+    # Stages
+
+    def channel_name(self, channel_url: str) -> str:
+        """Return the name of the channel. Looking it up means loading the whole channel page, so it is cached"""
+        if (channel_name := metadata_cache.get("channel name", channel_url)) is None:
+            channel_name = pytube.Channel(channel_url).channel_name
+            metadata_cache.set("channel name", channel_url, channel_name, CHANNEL_NAME_TTL)
+        return channel_name
+
+    def video_metadata(self, job: VideoJob) -> dict:
+        """Return the information about the video that goes into the index and the note, from the cache if possible"""
+        if (metadata := metadata_cache.get("video", job.video_id)) is None:
+            video = job.get_video()
+            metadata = {"video_id": video.video_id, "title": video.title, "channel_name": self.channel_name(video.channel_url), "channel_id": video.channel_id,
+                        "channel_url": video.channel_url, "publish_date": video.publish_date.strftime("%Y-%m-%d"), "watch_url": video.watch_url, "description": video.description,
+                        "views": video.views, "length": video.length, "thumbnail_url": video.thumbnail_url}
+            metadata_cache.set("video", job.video_id, metadata, VIDEO_METADATA_TTL)
+        return metadata
+
+    def stage_metadata(self, job: VideoJob):
+        """Initialize video information and file names. Returns False if the video has already been imported"""
+        # an interrupted import is resumed with the profiles it was started with
+        profile = job.metadata.get("profile", self.profile)
+        output_profile = job.metadata.get("output profile", self.output_profile)
+        job.metadata = dict(self.video_metadata(job), profile=profile)
+        job.metadata["output profile"] = output_profile
+        job.log(job.metadata["title"])
+        publish_date = job.metadata["publish_date"]
+        title = job.metadata["title"]
+        attachments_folder = joinpath(self.target_folder_for_attachments, publish_date)
 
         # Determine filenames and -paths
-        filenames = {}
-        filenames["base"] = string_to_filename(f"{publish_date} {video.title} ({video.video_id})")
-        filenames["base truncated"] = string_to_filename(f"{publish_date} {video.title[:50]} ({video.video_id})")
+        filenames = job.filenames
+        filenames["base"] = string_to_filename(f"{publish_date} {title} ({job.video_id})")
+        filenames["base truncated"] = string_to_filename(f"{publish_date} {title[:50]} ({job.video_id})")
 
-        filenames["video file"] = f'{filenames["base"]}.{video_file_extension}'
         filenames["thumbnail"] = filenames["base"] + ".jpg"
         filenames["captions vtt"] = filenames["base"] + ".vtt"
         filenames["captions md"] = filenames["base"] + " - Transcript.md"
-        filenames["comments md"] = string_to_filename(video.video_id) + " - Comments.md"  # speculative
+        filenames["comments md"] = string_to_filename(job.video_id) + " - Comments.md"
 
-        filepath = {}
-        filepath["captions vtt"] = joinpath(self.temp_folder, filenames["captions vtt"])
-        filepath["captions md"] = joinpath(self.output_attachments_folder, filenames["captions md"])
-        filepath["video file"] = joinpath(self.output_attachments_folder, filenames["video file"])
-        filepath["thumbnail"] = joinpath(self.output_attachments_folder, filenames["thumbnail"])
+        # attachments are written straight into the attachments folder, no intermediate copy
+        filepath = job.filepath
+        filepath["attachments folder"] = attachments_folder
+        filepath["captions vtt"] = joinpath(job.temp_folder, filenames["captions vtt"])
+        filepath["thumbnail"] = joinpath(attachments_folder, filenames["thumbnail"])
+        filepath["comments md"] = joinpath(attachments_folder, filenames["comments md"])
         filepath["main md"] = joinpath(self.target_folder_for_md, f'🎞 {filenames["base"]} (YouTube).md')
 
-        # Download transcripts
-
-        captions = download_transcript(video.video_id, filepath["captions md"], "obsidian", return_raw=True)
-        captions_success = download_transcript(video.video_id, filepath["captions vtt"], "webvtt")
-
-        # Download streams and generate output video with ffmpeg
-        print("downloading streams")
-        if captions_success:
-            caption_track = ffmpeg.input(filepath["captions vtt"])
-        saved_video = ffmpeg.input(video_stream.download(output_path=self.temp_folder))
-        saved_audio = ffmpeg.input(audio_stream.download(output_path=self.temp_folder_audio))
-        if video_file_extension == "webm":
-            if captions_success:
-                out = ffmpeg.output(saved_video, saved_audio, caption_track, filepath["video file"], vcodec='copy',
-                                    acodec='copy').run()
-            else:
-                out = ffmpeg.output(saved_video, saved_audio, filepath["video file"], vcodec='copy',
-                                    acodec='copy').run()
+        # check if video was already downloaded before it was added to the index
+        if os.path.exists(filepath["main md"]):
+            job.log("video already downloaded, skipping")
+            self.clean_up(job)
+            return False
+
+        os.makedirs(job.temp_folder, exist_ok=True)
+        os.makedirs(attachments_folder, exist_ok=True)
+
+    def stage_captions(self, job: VideoJob):
+        """Download the transcript once and save it as WebVTT caption track. The note is rendered from the cached transcript"""
+        transcripts = download_transcript(job.video_id, {"webvtt": job.filepath["captions vtt"]})
+        transcript_file = find_cached_transcript(job.video_id)
+        # the other stages of the group save the job at the same time, so it's only changed under the lock
+        with self.progress_lock:
+            job.metadata["captions vtt"] = "webvtt" in transcripts
+            job.metadata["transcript_file"] = transcript_file
+
+    def stage_streams(self, job: VideoJob):
+        """Download the streams the capture profile asks for, video and audio stream at the same time"""
+        profile = job.metadata["profile"]
+        if profile == "transcript":
+            with self.progress_lock:
+                job.filenames["video file"] = None
+            return
+
+        video = job.get_video()
+        if profile == "audio":
+            video_stream, audio_stream = None, select_audio_stream(video.streams)
+            video_file_extension = AUDIO_FILE_EXTENSION[audio_stream.subtype]
+        else:
+            max_bitrate = CAPPED_MAX_BITRATE if profile == "capped" and not self.max_bitrate else self.max_bitrate
+            video_stream, audio_stream, video_file_extension = select_streams(video.streams, video.length, max_bitrate=max_bitrate)
+            video_file_extension = OUTPUT_PROFILES[job.metadata["output profile"]].output_extension(video_file_extension)
+            job.log("Best stream:", video_stream)
+        job.log("Audio stream:", audio_stream)
+        video_file = f'{job.filenames["base"]}.{video_file_extension}'
+        video_path = joinpath(job.filepath["attachments folder"], video_file)
+        # the other stages of the group save the job at the same time, so it's only changed under the lock
+        with self.progress_lock:
+            job.filenames["video file"] = video_file
+            job.filepath["video file"] = video_path
+            job.metadata["video file extension"] = video_file_extension
+        if os.path.isfile(video_path):
+            job.log(video_path, "existiert bereits, wird nicht überschrieben.")
+            return
+
+        job.log("downloading streams")
+        streams = {name: stream for name, stream in [["video", video_stream], ["audio", audio_stream]] if stream}
+        files = dict(zip(streams, download_streams(*[(stream, f"{job.video_id} {stream.itag}.{stream.subtype}") for stream in streams.values()])))
+        with self.progress_lock:
+            job.files = files
+
+    def stage_thumbnail(self, job: VideoJob):
+        """Download the thumbnail, shrink it if it's too large and store it once for all videos that share it"""
+        if os.path.isfile(job.filepath["thumbnail"]):
+            job.log(job.filepath["thumbnail"], "existiert bereits, wird nicht überschrieben.")
+            return
+        job.log("downloading thumbnail")
+        try:
+            data = download_file(job.metadata["thumbnail_url"])
+            if self.thumbnail_max_bytes:
+                data = recompress_image(data, self.thumbnail_max_bytes)
+            self.attachment_store.add(data, "jpg", job.filepath["thumbnail"])
+        except Exception as e:
+            job.log("Error downloading thumbnail", e)
+
+    def stage_comments(self, job: VideoJob):
+        """Page through the comment threads and append them to the comments note one page at a time, up to max_comments threads.
+        After every page the next page token is saved, so an interrupted download continues where it stopped"""
+        path = job.filepath["comments md"]
+        partial_path = path + ".part"
+        if os.path.isfile(path):
+            job.log(path, "existiert bereits, wird nicht überschrieben.")
+            return
+        if not self.youtube_api_key:
+            job.log("Kein YouTube API key, Kommentare werden nicht heruntergeladen")
+            return
+
+        # next page, threads written so far and the size of the partial file after the last finished page
+        progress = job.metadata.get("comments progress")
+        if progress and os.path.isfile(partial_path):
+            # drop whatever was written after the last saved page
+            os.truncate(partial_path, progress["offset"])
         else:
-            out = ffmpeg.output(saved_video, saved_audio, filepath["video file"], vcodec='copy', acodec='copy').run()
+            progress = {"page": None, "count": 0, "offset": 0}
+            with open(partial_path, "wb") as file:
+                file.write(f'# Comments: {job.metadata["title"]}\n\n[[🎞 {job.filenames["base"]} (YouTube)]]\n\n'.encode("utf-8"))
 
-        # Download thumbnail
-        print("downloading thumbnail")
-        with open(filepath["thumbnail"], "wb+") as file:
+        job.log("downloading comments")
+        with open(partial_path, "ab") as file:
             try:
-                file.write(requests.get(video.thumbnail_url).content)
-            except Exception as e:
-                print("Error downloading thumbnail", e)
+                if progress["count"] == 0 or progress["page"]:
+                    for threads, next_page in comment_pages(job.video_id, self.youtube_api_key, progress["page"]):
+                        if self.max_comments:
+                            threads = threads[:self.max_comments - progress["count"]]
+                        for thread in threads:
+                            file.write(format_thread(thread).encode("utf-8"))
+                        file.flush()
+                        progress = {"page": next_page, "count": progress["count"] + len(threads), "offset": file.tell()}
+                        with self.progress_lock:
+                            job.metadata["comments progress"] = progress
+                            job.save()
+                        if self.max_comments and progress["count"] >= self.max_comments:
+                            break
+            except CommentsDisabled:
+                file.write("Kommentare sind deaktiviert.\n".encode("utf-8"))
+            except requests.RequestException as e:
+                # quota exceeded, private video, server errors: comments are optional, the saved page is continued next time
+                job.log("Error downloading comments", e)
+                return SKIPPED
+        os.replace(partial_path, path)
+        job.log(progress["count"], "Kommentare gespeichert")
 
-        # Fill out template
-        template = obsidian_template
-        for x in [["%title", video.title], ["%channel_id", video.channel_id], ["%youtube_link", video.watch_url], ["%description", video.description.replace("~~", "--")], ["%view_count", str(video.views)],
-                  ["%downloaded_date", datetime2.now().strftime("%Y-%m-%d")], ["%video_file", filenames["video file"]], ["%thumbnail", filenames["thumbnail"]], ["%transcript", captions], ["%comments", filenames["comments md"]]]:
-            template = template.replace(x[0], str(x[1]))
+    def stage_remux(self, job: VideoJob):
+        """Generate output video with ffmpeg, as the output profile says"""
+        if not job.files:
+            # the video file already existed
+            return
+        # resumed imports didn't download the streams in this process, keep other imports from evicting them
+        stream_cache.hold(job.files.values())
+        if not all(os.path.isfile(path) for path in job.files.values()):
+            # evicted from the stream cache since they were downloaded
+            self.stage_streams(job)
+
+        if "video" not in job.files:
+            # audio only: the stream already is the final file. Copied into a partial file first, like ffmpeg's output
+            partial_path = job.filepath["video file"] + ".part"
+            shutil.copyfile(job.files["audio"], partial_path)
+            os.replace(partial_path, job.filepath["video file"])
+            return
+
+        inputs = [job.files["video"], job.files["audio"]]
+        if job.metadata["captions vtt"] and job.metadata["video file extension"] == "webm":
+            inputs.append(job.filepath["captions vtt"])
+
+        remux(inputs, job.filepath["video file"], job.metadata["video file extension"], OUTPUT_PROFILES[job.metadata["output profile"]], duration=job.metadata["length"],
+              threads=self.transcode_threads, niceness=self.transcode_niceness, log=job.log)
+
+    def stage_note(self, job: VideoJob):
+        """Add the video to the index and write its note from the indexed information. The transcript is added to the search index"""
+        record = dict(job.metadata, downloaded_date=datetime2.now().strftime("%Y-%m-%d"), video_file=job.filenames["video file"], thumbnail_file=job.filenames["thumbnail"],
+                      comments_file=job.filenames["comments md"], note_file=job.filepath["main md"])
 
         # Write filled out template to md file
-        if os.path.isfile(filepath["main md"]):
-            print("Zieldatei existiert bereits, abgebrochen")
-        else:
-            with open(filepath["main md"], "w+", encoding="utf-8") as file:
-                file.write(template)
-
-        # Move files from 'output' folder to attachments folder
-        for f in ["thumbnail", "video file"]:
-            target_path = joinpath(self.target_folder_for_attachments, filenames[f])
-            if os.path.isfile(target_path):
-                print(target_path, "existiert bereits, wird nicht überschrieben.")
-                continue
-            shutil.move(filepath[f], target_path)
-        self.clean_up_temp()
+        if not write_note(record):
+            job.log("Zieldatei existiert bereits, abgebrochen")
+        video_index.add(record)
+        if record.get("transcript_file"):
+            try:
+                transcript_search_index.add(job.video_id, record["title"], record["watch_url"], load_transcript(record["transcript_file"]))
+            except sqlite3.OperationalError as e:
+                # e.g. SQLite without FTS5. The note is written, the search index can be backfilled later
+                job.log("Transcript not added to the search index:", e)
+
+    # Cleaning up
+
+    def remove_partial_files(self, job: VideoJob):
+        """Delete output files that were still being written. The downloaded streams may be evicted again, they are kept if there's room"""
+        stream_cache.release(job.files.values())
+        if not (video_path := job.filepath.get("video file")):
+            # transcript only, or the streams stage didn't get that far
+            return
+        if os.path.isfile(partial_path := video_path + ".part"):
+            os.remove(partial_path)
+
+    def clean_up(self, job: VideoJob):
+        """Delete all temporary files, cache files and the saved progress of a finished video"""
+        shutil.rmtree(job.temp_folder, ignore_errors=True)
+        stream_cache.release(job.files.values())
+        # comments that couldn't be downloaded completely won't be resumed anymore
+        if job.filepath.get("comments md") and os.path.isfile(job.filepath["comments md"] + ".part"):
+            os.remove(job.filepath["comments md"] + ".part")
+        if os.path.isfile(job.progress_file):
+            os.remove(job.progress_file)
 
-    def clean_up_temp(self):
-        """Delete all temporary files and cache files"""
-        for file in os.listdir(self.output_attachments_folder):
-            os.remove(joinpath(self.output_attachments_folder, file))
-        if self.temp_folder:
-            shutil.rmtree(self.temp_folder)
 
+if __name__ == "__main__":
+    from .batch import main
 
-y = YoutubeDownloader()
-y.get(url)
\ No newline at end of file
+    main()
@@ -0,0 +1,47 @@
+import json
+import sqlite3
+import threading
+import time
+from .constants import METADATA_CACHE_FILE
+
+
+class MetadataCache:
+    """SQLite backed cache with expiry for information looked up on YouTube (channel names, video metadata)"""
+
+    def __init__(self, path: str = METADATA_CACHE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.con = None  # opened on first use, so importing the module doesn't create the cache file
+
+    def connect(self) -> sqlite3.Connection:
+        """Open the cache if that hasn't happened yet. Expects the lock to be held"""
+        if self.con is not None:
+            return self.con
+        con = sqlite3.connect(self.path, check_same_thread=False)
+        con.execute("""CREATE TABLE IF NOT EXISTS cache (
+                                kind TEXT NOT NULL,
+                                key TEXT NOT NULL,
+                                value TEXT NOT NULL,
+                                expires REAL NOT NULL,
+                                PRIMARY KEY (kind, key))""")
+        con.commit()
+        self.con = con
+        return con
+
+    def get(self, kind: str, key: str):
+        """Return the cached value, or None if there is none or it has expired"""
+        with self.lock:
+            row = self.connect().execute("SELECT value, expires FROM cache WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, kind: str, key: str, value, ttl: int):
+        """Cache value (anything json serializable) for ttl seconds"""
+        with self.lock:
+            self.connect().execute("INSERT OR REPLACE INTO cache (kind, key, value, expires) VALUES (?, ?, ?, ?)", (kind, key, json.dumps(value), time.time() + ttl))
+            self.con.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+            self.con.commit()
+
+
+metadata_cache = MetadataCache()
@@ -0,0 +1,67 @@
+import os
+from .constants import obsidian_template
+from .captions import formatters, load_transcript
+from .video_index import VideoIndex, video_index
+
+# the part of the note that belongs to the user, everything else is generated
+NOTES_HEADER = "\n# Notes\n"
+NOTES_END = "\n#youtubevideo"
+
+
+def media_embed(record: dict) -> str:
+    """Embed of the imported video or audio file. Transcript-only imports have neither, so they show the thumbnail"""
+    if record.get("video_file"):
+        return f"![[{record['video_file']}]]"
+    return f"![[{record['thumbnail_file']}]]"
+
+
+def render_note(record: dict, template: str = obsidian_template) -> str:
+    """Fill out the template with the indexed information of a video. Needs no network access"""
+    transcript = ""
+    if record.get("transcript_file") and os.path.isfile(record["transcript_file"]):
+        transcript = formatters["obsidian"].format_transcript(load_transcript(record["transcript_file"]))
+
+    for x in [["%title", record["title"]], ["%channel_id", record["channel_id"]], ["%youtube_link", record["watch_url"]], ["%description", record["description"].replace("~~", "--")],
+              ["%view_count", str(record["views"])], ["%downloaded_date", record["downloaded_date"]], ["%media", media_embed(record)], ["%video_file", record["video_file"] or ""], ["%thumbnail", record["thumbnail_file"]],
+              ["%transcript", transcript], ["%comments", record["comments_file"]]]:
+        template = template.replace(x[0], str(x[1]))
+    return template
+
+
+def notes_section(text: str) -> (int, int):
+    """Start and end of what the user wrote under # Notes (up to the #youtubevideo tag), or None if the note doesn't have that section anymore"""
+    end = text.find(NOTES_END)
+    start = text.rfind(NOTES_HEADER, 0, end) if end != -1 else -1
+    if start == -1:
+        return None
+    return start + len(NOTES_HEADER), end + 1
+
+
+def write_note(record: dict, overwrite: bool = False) -> bool:
+    """Render the note of a video and write it to its file. Returns False if the file exists and mustn't be overwritten.
+    When an existing note is overwritten, the user's notes are kept. Notes whose # Notes section can't be found are left alone (returns False)"""
+    note = render_note(record)
+    if os.path.isfile(record["note_file"]):
+        if not overwrite:
+            return False
+        with open(record["note_file"], "r", encoding="utf-8") as file:
+            existing = file.read()
+        if not (old := notes_section(existing)) or not (new := notes_section(note)):
+            return False
+        note = note[:new[0]] + existing[old[0]:old[1]] + note[new[1]:]
+    with open(record["note_file"], "w+", encoding="utf-8") as file:
+        file.write(note)
+    return True
+
+
+def rebuild_notes(index: VideoIndex = video_index):
+    """Re-render the notes of all indexed videos, e.g. after changing the template. What the user wrote under # Notes is kept"""
+    records = index.all()
+    skipped = [record["note_file"] for record in records if not write_note(record, overwrite=True)]
+    print(f"Rebuilt {len(records) - len(skipped)} notes")
+    if skipped:
+        print("Not rebuilt, the # Notes section wasn't found:", *skipped, sep="\n")
+
+
+if __name__ == "__main__":
+    rebuild_notes()
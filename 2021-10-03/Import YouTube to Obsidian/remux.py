@@ -0,0 +1,96 @@
+import collections
+import os
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+import ffmpeg
+
+
+@dataclass
+class OutputProfile:
+    """How ffmpeg turns the downloaded streams into the file that's embedded in the note"""
+    name: str
+    video_codec: str = "copy"  # ffmpeg encoder, or copy to keep the downloaded stream
+    audio_codec: str = "copy"
+    extension: str = None  # container of the output, None to keep the one of the downloaded streams
+    crf: int = None  # constant quality, lower is better
+    preset: str = None  # encoder speed preset, a string or number depending on the encoder
+    audio_bitrate: str = None
+
+    @property
+    def transcodes(self) -> bool:
+        return self.video_codec != "copy" or self.audio_codec != "copy"
+
+    def output_extension(self, stream_extension: str) -> str:
+        return self.extension or stream_extension
+
+    def output_args(self, extension: str, threads: int = None) -> dict:
+        """Output options for ffmpeg-python"""
+        args = {"format": extension, "vcodec": self.video_codec, "acodec": self.audio_codec}
+        if self.crf is not None:
+            args["crf"] = self.crf
+            if self.video_codec == "libvpx-vp9":
+                # constant quality mode of vp9
+                args["video_bitrate"] = 0
+        if self.preset is not None:
+            args["cpu-used" if self.video_codec == "libvpx-vp9" else "preset"] = self.preset
+        if self.audio_bitrate:
+            args["audio_bitrate"] = self.audio_bitrate
+        if threads:
+            args["threads"] = threads
+        if extension == "mp4":
+            # index at the start of the file, so Obsidian can start playing before it has read the whole file
+            args["movflags"] = "+faststart"
+        return args
+
+
+# Obsidian plays whatever Chromium plays: vp9 and av1, but not h265
+OUTPUT_PROFILES = {profile.name: profile for profile in [
+    OutputProfile("copy"),
+    OutputProfile("vp9", video_codec="libvpx-vp9", audio_codec="libopus", extension="webm", crf=36, preset=4, audio_bitrate="96k"),
+    OutputProfile("av1", video_codec="libsvtav1", audio_codec="libopus", extension="webm", crf=38, preset=8, audio_bitrate="96k"),
+]}
+
+
+def run_ffmpeg(stream, duration: float = None, niceness: int = None, log=print, log_interval: float = 10):
+    """Run an ffmpeg-python stream and log its progress every log_interval seconds, parsed from ffmpeg's -progress output
+    :param duration: length of the video in seconds, to log the progress in percent
+    :param niceness: added to the niceness of the ffmpeg process (POSIX only), so transcoding doesn't slow down everything else"""
+    command = stream.global_args("-progress", "pipe:1", "-nostats", "-loglevel", "error").compile()
+    if niceness and hasattr(os, "nice"):
+        # started through nice(1): preexec_fn isn't safe while other threads are downloading
+        command = ["nice", "-n", str(niceness)] + command
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    # read errors in the background, so a full stderr pipe can't block ffmpeg
+    errors = collections.deque(maxlen=50)
+    error_reader = threading.Thread(target=lambda: errors.extend(process.stderr), daemon=True)
+    error_reader.start()
+
+    progress, last_log = {}, time.time()
+    for line in process.stdout:
+        key, _, value = line.strip().partition("=")
+        progress[key] = value
+        # every report ends with a progress=continue (or progress=end) line
+        if key == "progress" and time.time() - last_log >= log_interval:
+            last_log = time.time()
+            # N/A or negative before the first frame is written
+            seconds = int(progress["out_time_us"]) / 1000000 if progress.get("out_time_us", "").isdigit() else 0
+            log(f"ffmpeg: {f'{seconds / duration:.0%}' if duration else f'{seconds:.0f}s'} ({progress.get('speed', '?').strip()})")
+
+    process.wait()
+    error_reader.join()
+    if process.returncode != 0:
+        raise ffmpeg.Error("ffmpeg", None, "".join(errors).encode("utf-8"))
+
+
+def remux(inputs: [str], output_path: str, extension: str, profile: OutputProfile, duration: float = None, threads: int = None, niceness: int = None, log=print):
+    """Combine the input files (video, audio and optionally a caption track) into output_path, copying or transcoding the streams as the profile says.
+    Writes to a partial file next to the output and renames it when ffmpeg has finished (same filesystem, no copy)"""
+    partial_path = output_path + ".part"
+    stream = ffmpeg.output(*[ffmpeg.input(path) for path in inputs], partial_path, **profile.output_args(extension, threads)).overwrite_output()
+    if profile.transcodes:
+        log(f"transcoding with profile {profile.name}")
+    run_ffmpeg(stream, duration, niceness if profile.transcodes else None, log)
+    os.replace(partial_path, output_path)
@@ -0,0 +1,80 @@
+from .constants import resolution_levels
+
+# lower is better. webm (vp9) first, then the widely compatible h264 in mp4
+CODEC_PREFERENCE = {"webm": {"vp9": 0, "vp8": 1}, "mp4": {"avc1": 2, "av01": 3}}
+AUDIO_CONTAINER = {"webm": "webm", "mp4": "mp4"}  # audio container that can be remuxed with each video container
+
+
+def target_resolution(length: int) -> int:
+    """Preferred maximum resolution based on video length (in seconds)"""
+    return resolution_levels[1 if 400 > length else 2 if 1000 > length else 3]
+
+
+def codec_rank(stream) -> int:
+    """Rank of the stream's container and codec, None if it isn't wanted at all"""
+    codecs = CODEC_PREFERENCE.get(stream.subtype, {})
+    return next((rank for codec, rank in codecs.items() if (stream.video_codec or "").startswith(codec)), None)
+
+
+def estimated_size(stream, length: int) -> int:
+    """Estimated file size in bytes from the stream's bitrate"""
+    return int((stream.bitrate or 0) * length / 8)
+
+
+def resolution(stream) -> int:
+    return int(stream.resolution[:-1]) if stream.resolution else 0
+
+
+def rank_video_streams(streams, length: int) -> list:
+    """Return all usable video-only streams, best first: the target resolution, then the next lower ones, and resolutions above the target only as a last resort.
+    Within one resolution by codec preference, then by bitrate"""
+    target = target_resolution(length)
+    candidates = [s for s in streams if s.type == "video" and not s.is_progressive and codec_rank(s) is not None]
+    return sorted(candidates, key=lambda s: (resolution(s) > target, abs(target - resolution(s)), codec_rank(s), -(s.bitrate or 0)))
+
+
+def best_audio_streams(streams) -> dict:
+    """Return the highest bitrate audio stream for every container"""
+    best = {}
+    for s in streams:
+        if s.type == "audio" and (s.subtype not in best or (s.bitrate or 0) > (best[s.subtype].bitrate or 0)):
+            best[s.subtype] = s
+    return best
+
+
+def select_audio_stream(streams):
+    """Return the audio stream with the highest bitrate of any container, for audio-only imports"""
+    audio = best_audio_streams(streams)
+    if not audio:
+        raise ValueError("No audio stream found")
+    return max(audio.values(), key=lambda s: s.bitrate or 0)
+
+
+def select_streams(streams, length: int, max_bytes: int = None, max_bitrate: int = None):
+    """Return the video stream that best matches mime type and resolution preferences, the best matching audio stream and the video file extension.
+    :param streams: all streams of the video (pytube StreamQuery or any iterable of streams)
+    :param length: length of the video in seconds
+    :param max_bytes: optional budget for the combined size of video and audio stream
+    :param max_bitrate: optional budget in bits per second, converted to a size budget using the video length
+    If no pair fits into the budget, the smallest one is chosen"""
+    streams = list(streams)
+    if max_bitrate:
+        max_bytes = min(max_bytes or max_bitrate * length // 8, max_bitrate * length // 8)
+
+    audio = best_audio_streams(streams)
+    smallest, smallest_size = None, None
+    for video_stream in rank_video_streams(streams, length):
+        audio_stream = audio.get(AUDIO_CONTAINER[video_stream.subtype])
+        if not audio_stream:
+            continue
+        size = estimated_size(video_stream, length) + estimated_size(audio_stream, length)
+        if max_bytes and size > max_bytes:
+            if smallest is None or size < smallest_size:
+                smallest, smallest_size = (video_stream, audio_stream, video_stream.subtype), size
+            continue
+        return video_stream, audio_stream, video_stream.subtype
+
+    if smallest:
+        # nothing fits into the budget, take the smallest pair
+        return smallest
+    raise ValueError("No suitable pair of video and audio stream found")
@@ -0,0 +1,153 @@
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+from .constants import SEARCH_INDEX_FILE
+
+# parts of an imported video note
+TITLE_PATTERN = re.compile(r"^# Video Name: (.*)$", re.MULTILINE)
+LINK_PATTERN = re.compile(r"^#### \[Link auf Youtube\]\((.*?)\)$", re.MULTILINE)
+VIDEO_ID_PATTERN = re.compile(r"[?&]v=([\w-]{11})")
+TRANSCRIPT_HEADER = "# Transcript (Not Proofread)"
+BLOCK_PATTERN = re.compile(r"^# (\d{2}):(\d{2}):(\d{2})\n\n(.*?)(?=^# \d{2}:\d{2}:\d{2}$|\Z)", re.MULTILINE | re.DOTALL)
+
+
+def timestamp(seconds: float) -> str:
+    """Format seconds as HH:MM:SS"""
+    hours, total_seconds = divmod(int(seconds), 3600)
+    mins, sec = divmod(total_seconds, 60)
+    return f"{str(hours).zfill(2)}:{str(mins).zfill(2)}:{str(sec).zfill(2)}"
+
+
+def deep_link(watch_url: str, seconds: float) -> str:
+    """Link to the video, starting at the given second"""
+    return f"{watch_url}{'&' if '?' in watch_url else '?'}t={int(seconds)}s"
+
+
+class TranscriptSearchIndex:
+    """SQLite FTS5 index of the transcript segments of all imported videos, keyed by video id and start time.
+    Finds where something was said without Obsidian having to read every note"""
+
+    def __init__(self, path: str = SEARCH_INDEX_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.con = None  # opened on first use: importing the module shouldn't create the index, and SQLite may be built without FTS5
+
+    def connect(self) -> sqlite3.Connection:
+        """Open the index if that hasn't happened yet. Expects the lock to be held"""
+        if self.con is not None:
+            return self.con
+        con = sqlite3.connect(self.path, check_same_thread=False)
+        con.execute("""CREATE TABLE IF NOT EXISTS videos (
+                                video_id TEXT PRIMARY KEY,
+                                title TEXT,
+                                watch_url TEXT)""")
+        con.execute("CREATE VIRTUAL TABLE IF NOT EXISTS segments USING fts5(text, video_id UNINDEXED, start UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')")
+        # UNINDEXED columns can't be searched without reading the whole table, this finds the segments of a video when it's indexed again
+        new_segment_map = con.execute("SELECT 1 FROM sqlite_master WHERE name = 'video_segments'").fetchone() is None
+        con.execute("CREATE TABLE IF NOT EXISTS video_segments (segment INTEGER PRIMARY KEY, video_id TEXT NOT NULL)")
+        con.execute("CREATE INDEX IF NOT EXISTS video_segments_video_id ON video_segments (video_id)")
+        if new_segment_map:
+            con.execute("INSERT INTO video_segments (segment, video_id) SELECT rowid, video_id FROM segments")
+        con.commit()
+        self.con = con
+        return con
+
+    def add(self, video_id: str, title: str, watch_url: str, segments: [dict]):
+        """Replace the indexed segments of a video
+        :param segments: dicts with 'start' (seconds) and 'text', like the raw transcript segments"""
+        with self.lock, self.connect():
+            self.con.execute("INSERT OR REPLACE INTO videos (video_id, title, watch_url) VALUES (?, ?, ?)", (video_id, title, watch_url))
+            self.con.execute("DELETE FROM segments WHERE rowid IN (SELECT segment FROM video_segments WHERE video_id = ?)", (video_id,))
+            self.con.execute("DELETE FROM video_segments WHERE video_id = ?", (video_id,))
+            rowids = [self.con.execute("INSERT INTO segments (text, video_id, start) VALUES (?, ?, ?)", (segment["text"], video_id, segment["start"])).lastrowid
+                      for segment in segments if segment["text"].strip()]
+            self.con.executemany("INSERT INTO video_segments (segment, video_id) VALUES (?, ?)", ((rowid, video_id) for rowid in rowids))
+
+    def is_indexed(self, video_id: str) -> bool:
+        with self.lock:
+            return self.connect().execute("SELECT 1 FROM videos WHERE video_id = ?", (video_id,)).fetchone() is not None
+
+    def search(self, query: str, limit: int = 20) -> [dict]:
+        """Return the best matching segments, best first. The query uses the FTS5 syntax: words, "phrases", AND/OR/NOT, prefix*.
+        If it isn't valid FTS5 (it's, a-b, an unclosed quote), every word is searched as it is"""
+        try:
+            rows = self.match(query, limit)
+        except sqlite3.OperationalError:
+            rows = self.match(" ".join('"' + term.replace('"', '""') + '"' for term in query.split()), limit)
+        return [{"video_id": video_id, "start": start, "snippet": snippet, "title": title, "timestamp": timestamp(start), "link": deep_link(watch_url, start)}
+                for video_id, start, snippet, title, watch_url in rows]
+
+    def match(self, query: str, limit: int) -> list:
+        with self.lock:
+            return self.connect().execute("""SELECT segments.video_id, segments.start, snippet(segments, 0, '**', '**', '…', 16), videos.title, videos.watch_url
+                                       FROM segments JOIN videos ON videos.video_id = segments.video_id
+                                       WHERE segments MATCH ? ORDER BY rank LIMIT ?""", (query, limit)).fetchall()
+
+    def optimize(self):
+        """Merge the index segments, worth it after a large backfill"""
+        with self.lock, self.connect():
+            self.con.execute("INSERT INTO segments (segments) VALUES ('optimize')")
+
+
+def parse_note(text: str) -> dict:
+    """Return video id, title, link and the transcript blocks of an imported video note, or None if it isn't one"""
+    link = LINK_PATTERN.search(text)
+    video_id = VIDEO_ID_PATTERN.search(link.group(1)) if link else None
+    if not video_id:
+        return None
+    title = TITLE_PATTERN.search(text)
+    transcript = text[text.find(TRANSCRIPT_HEADER) + len(TRANSCRIPT_HEADER):] if TRANSCRIPT_HEADER in text else ""
+    # the template ends with a line holding only a backslash
+    transcript = transcript.split("\n\\\n", 1)[0]
+    segments = [{"start": int(hours) * 3600 + int(mins) * 60 + int(sec), "text": " ".join(block.split())}
+                for hours, mins, sec, block in BLOCK_PATTERN.findall(transcript)]
+    return {"video_id": video_id.group(1), "title": title.group(1) if title else "", "watch_url": link.group(1), "segments": segments}
+
+
+def backfill(folder: str, index: TranscriptSearchIndex, reindex: bool = False) -> int:
+    """Index the transcripts of all video notes in the folder (recursively). Returns the number of indexed videos"""
+    start = time.time()
+    count = 0
+    for path in glob.iglob(os.path.join(glob.escape(folder), "**", "🎞 *(YouTube).md"), recursive=True):
+        with open(path, "r", encoding="utf-8") as file:
+            note = parse_note(file.read())
+        if not note or not note["segments"] or (not reindex and index.is_indexed(note["video_id"])):
+            continue
+        index.add(note["video_id"], note["title"], note["watch_url"], note["segments"])
+        count += 1
+    index.optimize()
+    print(f"Indexed {count} videos in {time.time() - start:.1f}s")
+    return count
+
+
+transcript_search_index = TranscriptSearchIndex()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the transcripts of all imported YouTube videos")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    search_parser = subparsers.add_parser("search", help="show where something was said")
+    search_parser.add_argument("query", nargs="+")
+    search_parser.add_argument("-n", "--limit", type=int, default=20)
+    backfill_parser = subparsers.add_parser("backfill", help="index the transcripts of existing notes")
+    backfill_parser.add_argument("folder")
+    backfill_parser.add_argument("--reindex", action="store_true", help="also index videos that are indexed already")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        backfill(args.folder, transcript_search_index, args.reindex)
+        return
+
+    start = time.time()
+    hits = transcript_search_index.search(" ".join(args.query), args.limit)
+    for hit in hits:
+        print(f"{hit['timestamp']}  {hit['title']}\n          {hit['link']}\n          {hit['snippet']}\n")
+    print(f"{len(hits)} hits in {(time.time() - start) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import sqlite3
+import threading
+from .constants import INDEX_FILE
+
+# columns of the index, in order
+COLUMNS = ["video_id", "title", "channel_name", "channel_id", "publish_date", "downloaded_date", "views", "length", "watch_url", "description", "thumbnail_url",
+           "video_file", "thumbnail_file", "comments_file", "note_file", "transcript_file", "profile"]
+
+
+class VideoIndex:
+    """Machine-readable record of every imported video, so notes can be checked for and re-rendered without asking YouTube"""
+
+    def __init__(self, path: str = INDEX_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.con = None  # opened on first use, so importing the module doesn't create the index file
+
+    def connect(self) -> sqlite3.Connection:
+        """Open the index if that hasn't happened yet. Expects the lock to be held"""
+        if self.con is not None:
+            return self.con
+        con = sqlite3.connect(self.path, check_same_thread=False)
+        con.row_factory = sqlite3.Row
+        con.execute("""CREATE TABLE IF NOT EXISTS videos (
+                                video_id TEXT PRIMARY KEY,
+                                title TEXT,
+                                channel_name TEXT,
+                                channel_id TEXT,
+                                publish_date TEXT,
+                                downloaded_date TEXT,
+                                views INTEGER,
+                                length INTEGER,
+                                watch_url TEXT,
+                                description TEXT,
+                                thumbnail_url TEXT,
+                                video_file TEXT,
+                                thumbnail_file TEXT,
+                                comments_file TEXT,
+                                note_file TEXT,
+                                transcript_file TEXT,
+                                profile TEXT)""")
+        # indexes created before there were capture profiles only contain videos
+        if "profile" not in [row["name"] for row in con.execute("PRAGMA table_info(videos)")]:
+            con.execute("ALTER TABLE videos ADD COLUMN profile TEXT DEFAULT 'video'")
+        con.execute("CREATE INDEX IF NOT EXISTS videos_channel ON videos (channel_id)")
+        con.commit()
+        self.con = con
+        return con
+
+    def add(self, record: dict):
+        """Insert or update the record of a video. Keys that aren't columns are ignored"""
+        with self.lock:
+            self.connect().execute(f"INSERT OR REPLACE INTO videos ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})", [record.get(column) for column in COLUMNS])
+            self.con.commit()
+
+    def is_imported(self, video_id: str) -> bool:
+        with self.lock:
+            return self.connect().execute("SELECT 1 FROM videos WHERE video_id = ?", (video_id,)).fetchone() is not None
+
+    def get(self, video_id: str) -> dict:
+        with self.lock:
+            row = self.connect().execute("SELECT * FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        return dict(row) if row else None
+
+    def all(self) -> [dict]:
+        with self.lock:
+            return [dict(row) for row in self.connect().execute("SELECT * FROM videos ORDER BY publish_date")]
+
+
+video_index = VideoIndex()